@@ -0,0 +1,214 @@
+from gosubl import gs
+from gosubl import sh
+import hashlib
+import json
+import math
+import os
+import re
+
+DOMAIN = 'GsBench'
+
+# BenchmarkName-8   	 1000000	      1234 ns/op	      64 B/op	       2 allocs/op
+BENCH_PAT = re.compile(r'^(Benchmark\S+)\s+(\d+)((?:\s+[\d.]+ \S+)+)\s*$', re.MULTILINE)
+METRIC_PAT = re.compile(r'([\d.]+) (\S+)')
+
+UNITS = ('ns/op', 'B/op', 'allocs/op', 'MB/s')
+
+# differences with a p-value above this are reported as noise
+ALPHA = 0.05
+
+def parse(out):
+	# returns the benchmarks in `out` as [name, {unit: [value...]}] in the order they first appear
+	l = []
+	m = {}
+	for name, _, metrics in BENCH_PAT.findall(out):
+		r = m.get(name)
+		if r is None:
+			r = m[name] = {}
+			l.append([name, r])
+		for v, unit in METRIC_PAT.findall(metrics):
+			try:
+				r.setdefault(unit, []).append(float(v))
+			except ValueError:
+				pass
+	return l
+
+def git_rev(wd):
+	# the git revision of `wd` or '' if it's not in a repo.
+	# uncommitted changes are marked so they don't get mixed up with the clean revision
+	cmd = sh.Command(['git', 'rev-parse', '--short', 'HEAD'])
+	cmd.wd = wd
+	cr = cmd.run()
+	r = cr.out.strip()
+	if not cr.ok or cr.err.strip() or not r:
+		return ''
+
+	cmd = sh.Command(['git', 'status', '--porcelain', '--untracked-files=no'])
+	cmd.wd = wd
+	cr = cmd.run()
+	if cr.out.strip():
+		r += '-dirty'
+	return r
+
+def _dir(pkg):
+	return gs.home_dir_path('9o', 'bench', hashlib.sha1(pkg.encode('utf-8')).hexdigest())
+
+def save(pkg, rev, results):
+	fn = os.path.join(_dir(pkg), '%s.json' % rev)
+	try:
+		with open(fn, 'w', encoding='utf-8') as f:
+			json.dump({'pkg': pkg, 'rev': rev, 'results': results}, f)
+	except Exception:
+		gs.error_traceback(DOMAIN)
+
+def load(pkg, rev):
+	fn = os.path.join(_dir(pkg), '%s.json' % rev)
+	try:
+		with open(fn, 'r', encoding='utf-8') as f:
+			d, _ = gs.json_decode(f.read(), {})
+			return d.get('results', [])
+	except FileNotFoundError:
+		return None
+	except Exception:
+		gs.error_traceback(DOMAIN)
+		return None
+
+def revs(pkg):
+	# the revisions with stored runs for `pkg`, most recent first
+	d = _dir(pkg)
+	try:
+		l = [fn for fn in os.listdir(d) if fn.endswith('.json')]
+	except Exception:
+		return []
+	l.sort(key=lambda fn: os.path.getmtime(os.path.join(d, fn)), reverse=True)
+	return [fn[:-5] for fn in l]
+
+def mean(l):
+	return sum(l) / len(l)
+
+def stddev(l):
+	if len(l) < 2:
+		return 0.0
+	m = mean(l)
+	return math.sqrt(sum((v - m) ** 2 for v in l) / (len(l) - 1))
+
+def _betacf(a, b, x):
+	# continued fraction for the incomplete beta function (Numerical Recipes, betacf)
+	tiny = 1e-30
+	qab = a + b
+	qap = a + 1.0
+	qam = a - 1.0
+	c = 1.0
+	d = 1.0 - qab * x / qap
+	if abs(d) < tiny:
+		d = tiny
+	d = 1.0 / d
+	h = d
+	for m in range(1, 201):
+		m2 = 2 * m
+		aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+		d = 1.0 + aa * d
+		if abs(d) < tiny:
+			d = tiny
+		c = 1.0 + aa / c
+		if abs(c) < tiny:
+			c = tiny
+		d = 1.0 / d
+		h *= d * c
+		aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+		d = 1.0 + aa * d
+		if abs(d) < tiny:
+			d = tiny
+		c = 1.0 + aa / c
+		if abs(c) < tiny:
+			c = tiny
+		d = 1.0 / d
+		de = d * c
+		h *= de
+		if abs(de - 1.0) < 3e-12:
+			break
+	return h
+
+def _betai(a, b, x):
+	# the regularized incomplete beta function I_x(a, b)
+	if x <= 0.0:
+		return 0.0
+	if x >= 1.0:
+		return 1.0
+	bt = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+	if x < (a + 1.0) / (a + b + 2.0):
+		return bt * _betacf(a, b, x) / a
+	return 1.0 - bt * _betacf(b, a, 1.0 - x) / b
+
+def ttest(a, b):
+	# the two-sided p-value of Welch's t-test for `a` and `b` having the same mean
+	# or None if there aren't enough samples
+	if len(a) < 2 or len(b) < 2:
+		return None
+
+	va = stddev(a) ** 2 / len(a)
+	vb = stddev(b) ** 2 / len(b)
+	if va + vb == 0:
+		return 1.0 if mean(a) == mean(b) else 0.0
+
+	t = (mean(a) - mean(b)) / math.sqrt(va + vb)
+	df = (va + vb) ** 2 / (va ** 2 / (len(a) - 1) + vb ** 2 / (len(b) - 1))
+	return _betai(df / 2.0, 0.5, df / (df + t * t))
+
+def _fmt_val(l):
+	m = mean(l)
+	s = '%.4g' % m
+	if m:
+		s = '%s ±%.0f%%' % (s, 100.0 * stddev(l) / m)
+	return s
+
+def compare(old, new):
+	# returns a benchstat-like table comparing the results `old` and `new`.
+	# if `old` is empty, only the stats of `new` are listed
+	om = dict((name, r) for name, r in (old or []))
+	units = [u for u in UNITS if any(u in r for _, r in new)]
+	units.extend(sorted(set(u for _, r in new for u in r) - set(units)))
+
+	rows = []
+	for unit in units:
+		if rows:
+			rows.append(None)
+
+		if om:
+			rows.append(('name', 'old %s' % unit, 'new %s' % unit, 'delta'))
+		else:
+			rows.append(('name', unit))
+
+		for name, r in new:
+			nv = r.get(unit)
+			if not nv:
+				continue
+
+			ov = om.get(name, {}).get(unit)
+			if not om:
+				rows.append((name, _fmt_val(nv)))
+			elif not ov:
+				rows.append((name, '', _fmt_val(nv), ''))
+			else:
+				p = ttest(ov, nv)
+				mo, mn = mean(ov), mean(nv)
+				if p is None or p > ALPHA or not mo:
+					delta = '~'
+				else:
+					delta = '%+.2f%%' % (100.0 * (mn - mo) / mo)
+				if p is not None:
+					delta = '%s  (p=%.3f n=%d+%d)' % (delta, p, len(ov), len(nv))
+				rows.append((name, _fmt_val(ov), _fmt_val(nv), delta))
+
+	widths = {}
+	for row in rows:
+		for i, s in enumerate(row or ()):
+			widths[i] = max(widths.get(i, 0), len(s))
+
+	l = []
+	for row in rows:
+		if row is None:
+			l.append('')
+		else:
+			l.append('  '.join(s.ljust(widths[i]) for i, s in enumerate(row)).rstrip())
+	return '\n'.join(l)
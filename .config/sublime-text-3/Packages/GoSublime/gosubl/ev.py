@@ -39,3 +39,6 @@ class Event(object):
 
 debug = Event()
 init = Event()
+
+# called after the GoSublime settings changed
+settings = Event()
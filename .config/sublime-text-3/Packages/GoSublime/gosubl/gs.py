@@ -2,6 +2,7 @@
 # sublime: translate_tabs_to_spaces false; rulers [100,120]
 
 from gosubl import about
+from gosubl import ev
 from subprocess import Popen, PIPE
 import copy
 import datetime
@@ -78,6 +79,7 @@ _default_settings = {
 	"autocomplete_suggest_imports": False,
 	"on_save": [],
 	"shell": [],
+	"shell_coproc": False,
 	"default_snippets": [],
 	"snippets": [],
 	"fn_exclude_prefixes": [".", "_"],
@@ -91,6 +93,8 @@ _default_settings = {
 	"9o_settings": {},
 	"9o_aliases": {},
 	"9o_show_end": False,
+	"9o_scrollback_limit": 1000000,
+	"9o_max_jobs": 4,
 	"gohtml_extensions": [],
 	"autoinst": False,
 	"use_gs_gopath": False,
@@ -473,6 +477,7 @@ def mirror_settings(so):
 
 def sync_settings():
 	_settings.update(mirror_settings(settings_obj()))
+	ev.settings()
 
 def view_fn(view):
 	if view is not None:
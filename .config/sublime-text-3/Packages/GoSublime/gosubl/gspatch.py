@@ -1,44 +1,94 @@
-from gosubl import gs
 import sublime
 import sys
 
-if gs.PY3K:
-	from something_borrowed.diff_match_patch.python3.diff_match_patch import diff_match_patch
-else:
-	from something_borrowed.diff_match_patch.python2.diff_match_patch import diff_match_patch
+from something_borrowed.diff_match_patch import diff_match_patch
 
 class MergeException(Exception):
 	pass
 
-def _merge(view, size, text, edit):
-	def ss(start, end):
-		return view.substr(sublime.Region(start, end))
+def _merge(view, src, text, edit):
+	# `src` is a snapshot of the buffer, everything is checked against it in memory
+	# instead of calling into the API for every chunk
+	if src == text:
+		# most saves are of files that are already formatted
+		return False
+
+	edits = _edits(src, _diff(src, text))
+	# apply from the end so the offsets of the remaining edits stay valid
+	for start, end, s in reversed(edits):
+		if start == end:
+			view.insert(edit, start, s)
+		elif s:
+			view.replace(edit, sublime.Region(start, end), s)
+		else:
+			view.erase(edit, sublime.Region(start, end))
+	return len(edits) > 0
+
+def _diff(src, text):
+	# fmt tools almost only change whole lines so diff the lines first
+	# and then only diff the characters inside the hunks that changed.
+	# patience lines up on unique lines instead of braces and blank lines
 	dmp = diff_match_patch()
-	diffs = dmp.diff_main(ss(0, size), text)
-	dmp.diff_cleanupEfficiency(diffs)
+	a, b, lines = dmp.diff_linesToChars(src, text)
+	line_diffs = dmp.diff_patience(a, b)
+	dmp.diff_charsToLines(line_diffs, lines)
+	line_diffs.append((dmp.DIFF_EQUAL, ''))
+
+	diffs = []
+	dels = []
+	ins = []
+	for k, s in line_diffs:
+		if k < 0:
+			dels.append(s)
+		elif k > 0:
+			ins.append(s)
+		else:
+			if dels and ins:
+				hunk = dmp.diff_main(''.join(dels), ''.join(ins), False)
+				dmp.diff_cleanupEfficiency(hunk)
+				diffs.extend(hunk)
+			elif dels:
+				diffs.append((dmp.DIFF_DELETE, ''.join(dels)))
+			elif ins:
+				diffs.append((dmp.DIFF_INSERT, ''.join(ins)))
+
+			dels = []
+			ins = []
+			if s:
+				diffs.append((k, s))
+	return diffs
+
+def _edits(src, diffs):
+	# convert `diffs` into a list of (start, end, replacement) in `src` offsets,
+	# coalescing adjacent inserts and deletes into a single replacement
+	edits = []
 	i = 0
-	dirty = False
-	for d in diffs:
-		k, s = d
+	for k, s in diffs:
 		l = len(s)
 		if k == 0:
 			# match
-			l = len(s)
-			if ss(i, i+l) != s:
-				raise MergeException('mismatch', dirty)
+			if src[i:i+l] != s:
+				raise MergeException('mismatch', False)
 			i += l
+			continue
+
+		if k > 0:
+			# insert
+			start, end = i, i
+		else:
+			# delete
+			if src[i:i+l] != s:
+				raise MergeException('mismatch', False)
+			start, end = i, i+l
+			s = ''
+			i += l
+
+		if edits and edits[-1][1] == start:
+			pstart, _, ps = edits[-1]
+			edits[-1] = (pstart, end, ps + s)
 		else:
-			dirty = True
-			if k > 0:
-				# insert
-				view.insert(edit, i, s)
-				i += l
-			else:
-				# delete
-				if ss(i, i+l) != s:
-					raise MergeException('mismatch', dirty)
-				view.erase(edit, sublime.Region(i, i+l))
-	return dirty
+			edits.append((start, end, s))
+	return edits
 
 def merge(view, size, text, edit):
 	vs = view.settings()
@@ -53,10 +103,10 @@ def merge(view, size, text, edit):
 		err = ''
 		if size < 0:
 			size = view.size()
-		dirty = _merge(view, size, text, edit)
+		dirty = _merge(view, origin_src[:size], text, edit)
 	except MergeException as ex:
 		dirty = True
-		err = "Could not merge changes into the buffer, edit aborted: %s" % ex[0]
+		err = "Could not merge changes into the buffer, edit aborted: %s" % ex.args[0]
 		view.replace(edit, sublime.Region(0, view.size()), origin_src)
 	except Exception as ex:
 		err = "where ma bees at?: %s" % ex
@@ -1,8 +1,10 @@
 from gosubl import gs
 from gosubl import sh
+import errno
 import hashlib
 import os
 import re
+import select
 import signal
 import string
 import sublime
@@ -11,11 +13,19 @@ import threading
 import time
 import traceback
 
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
 DOMAIN = "GsShell"
 GO_RUN_PAT = re.compile(r'^go\s+(run|play)$', re.IGNORECASE)
 GO_SHARE_PAT = re.compile(r'^go\s+share$', re.IGNORECASE)
 GO_PLAY_PAT = re.compile(r'(\b)go\s+play(\b)', re.IGNORECASE)
 
+# how long a cancelled command has to exit after SIGTERM, before it's sent SIGKILL
+CANCEL_TIMEOUT = 0.600
+
 def command_on_output(c, line):
 	c.outq().put(line)
 
@@ -111,37 +121,186 @@ def run(cmd=[], shell=False, env={}, cwd=None, input=None, stderr=subprocess.STD
 
 	return (out, err, exc)
 
-class CommandStdoutReader(threading.Thread):
-	def __init__(self, c, stdout):
-		super(CommandStdoutReader, self).__init__()
+class Supervisor(threading.Thread):
+	# Supervisor reads the output of all running commands in a single thread.
+	# Output is read in chunks of up to CHUNK_SIZE bytes and handed to the command as a batch of lines.
+	# No SIGCHLD handler is installed and no other process is waited on, running commands are reaped individually
+	# with Popen.poll(), which is safe alongside other users of subprocess. A command's exit is reported when
+	# it happens, output of any children that outlive it and keep its pipes open is still delivered afterwards.
+	#
+	# On Windows, pipes can't be select()ed so each command gets its own reader thread instead.
+
+	CHUNK_SIZE = 64 * 1024
+
+	# how often running commands are polled for their exit status
+	REAP_INTERVAL = 0.050
+
+	def __init__(self):
+		super(Supervisor, self).__init__()
 		self.daemon = True
-		self.stdout = stdout
-		self.c = c
+		self.lck = threading.Lock()
+		self.fds = {}
+		self.procs = []
+		self.wake_r, self.wake_w = os.pipe()
+
+	def add(self, c, files):
+		with self.lck:
+			c.nfiles += len(files)
+			if os.name != 'nt':
+				for f in files:
+					fd = f.fileno()
+					# a stale readiness report (e.g. after the fd was reused) mustn't block the loop
+					fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+					self.fds[fd] = (c, f)
+				if c not in self.procs:
+					self.procs.append(c)
+
+		if os.name == 'nt':
+			for f in files:
+				t = threading.Thread(target=self.read_all, args=(c, f))
+				t.daemon = True
+				t.start()
+		else:
+			self.wake()
+
+	def remove(self, c):
+		# stop reading c's output and close its pipes, it's still reaped when it exits
+		with self.lck:
+			l = [(fd, f) for fd, (x, f) in self.fds.items() if x is c]
+			for fd, f in l:
+				del self.fds[fd]
+			if l:
+				c.nfiles = 0
+
+		for _, f in l:
+			try:
+				f.close()
+			except Exception:
+				pass
 
-	def run(self):
+		if l:
+			c.eof()
+			self.wake()
+
+	def wake(self):
 		try:
-			while True:
-				line = self.stdout.readline()
+			os.write(self.wake_w, b'.')
+		except Exception:
+			pass
 
-				if not line:
-					self.c.close_stdout()
+	def read_all(self, c, f):
+		try:
+			while True:
+				s = os.read(f.fileno(), self.CHUNK_SIZE)
+				if not s:
 					break
+				c.feed(s)
+		except Exception:
+			pass
 
-				if not self.c.output_started:
-					self.c.output_started = time.time()
+		with self.lck:
+			c.nfiles -= 1
+			if c.nfiles > 0:
+				return
 
-				try:
-					self.c.on_output(self.c, gs.ustr(line.rstrip('\r\n')))
-				except Exception:
-					gs.println(gs.traceback(DOMAIN))
+		c.eof()
+		try:
+			c.p.wait()
 		except Exception:
-			gs.println(gs.traceback(DOMAIN))
+			pass
+		c.exited()
+
+	def run(self):
+		while True:
+			try:
+				self.step()
+			except Exception:
+				gs.println(gs.traceback(DOMAIN))
+				time.sleep(self.REAP_INTERVAL)
 
+	def step(self):
+		with self.lck:
+			fds = list(self.fds.keys())
+			timeout = self.REAP_INTERVAL if self.procs else None
+
+		try:
+			rl, _, _ = select.select([self.wake_r] + fds, [], [], timeout)
+		except (OSError, select.error, ValueError):
+			# an fd was closed by remove(), the next step won't see it
+			rl = []
+
+		for fd in rl:
+			if fd == self.wake_r:
+				os.read(self.wake_r, 4096)
+			else:
+				self.read(fd)
+
+		with self.lck:
+			l = [c for c in self.procs if c.p.poll() is not None]
+			for c in l:
+				self.procs.remove(c)
+			fds = [fd for fd, (c, _) in self.fds.items() if c in l]
+
+		# what was written before the exit is delivered first, but children that outlive
+		# the command and keep writing can't hold up its exit
+		for fd in fds:
+			for i in range(16):
+				if not self.read(fd):
+					break
+
+		for c in l:
+			c.exited()
+
+	def read(self, fd):
+		# read() hands the next chunk of fd's output to its command, or closes it at EOF.
+		# it returns False if there was nothing to read
+		with self.lck:
+			c, f = self.fds.get(fd, (None, None))
+		if c is None:
+			return False
+
+		try:
+			s = os.read(fd, self.CHUNK_SIZE)
+		except OSError as ex:
+			if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+				return False
+			s = b''
+
+		if s:
+			c.feed(s)
+			return True
+
+		with self.lck:
+			if self.fds.pop(fd, None) is None:
+				# it was removed while we were reading
+				return False
+			c.nfiles -= 1
+			done = c.nfiles <= 0
+		try:
+			f.close()
+		except Exception:
+			pass
+		if done:
+			c.eof()
+		return False
 
-class Command(threading.Thread):
+_supervisor = None
+_supervisor_lck = threading.Lock()
+
+def supervisor():
+	global _supervisor
+	with _supervisor_lck:
+		if _supervisor is None:
+			_supervisor = Supervisor()
+			if os.name != 'nt':
+				_supervisor.start()
+		return _supervisor
+
+class Command(object):
+	# Command runs `cmd` in the background when start() is called.
+	# Its output is delivered by the supervisor, a line at a time through on_output,
+	# and on_done and the functions in `done` are called when it exits.
 	def __init__(self, cmd=[], shell=False, env={}, cwd=None):
-		super(Command, self).__init__()
-		self.daemon = True
 		self.cancelled = False
 		self.q = gs.queue.Queue()
 		self.p = None
@@ -157,6 +316,10 @@ class Command(threading.Thread):
 		self.cwd = cwd if cwd else None
 		self.on_done = command_on_done
 		self.done = []
+		self.tid = ''
+		self.buf = b''
+		self.nfiles = 0
+		self.ended_evt = threading.Event()
 
 	def outq(self):
 		return self.q
@@ -184,69 +347,144 @@ class Command(threading.Thread):
 			return self.p.poll()
 		return False
 
-	def cancel(self):
+	def cancel(self, cb=None):
+		# cancel() returns straight away. the process group is sent SIGTERM and, if it's still running
+		# after CANCEL_TIMEOUT, SIGKILL. the waiting is done in the background and `cb(discarded)` is called
+		# when it's over, `discarded` is the number of lines of output that were dropped
+		self.cancelled = True
 		if self.poll() is None:
+			self.signal(signal.SIGTERM)
+
+		t = threading.Thread(target=self.cancel_wait, args=(cb,))
+		t.daemon = True
+		t.start()
+
+	def cancel_wait(self, cb):
+		discarded = 0
+		try:
+			if not self.ended_evt.wait(CANCEL_TIMEOUT):
+				if self.poll() is None:
+					# there's no SIGKILL on Windows
+					self.signal(getattr(signal, 'SIGKILL', None))
+				# children that outlive the process may still hold its output open
+				self.close_stdout()
+				self.ended_evt.wait(CANCEL_TIMEOUT)
+
+			try:
+				while True:
+					self.q.get_nowait()
+					discarded += 1
+			except gs.queue.Empty:
+				pass
+		except Exception:
+			gs.notice(DOMAIN, gs.traceback())
+
+		if cb:
 			try:
-				os.killpg(self.p.pid, signal.SIGTERM)
+				cb(discarded)
 			except Exception:
-				self.p.terminate()
+				gs.notice(DOMAIN, gs.traceback())
 
-			time.sleep(0.100)
-			if not self.completed():
-				time.sleep(0.500)
-				if not self.completed():
-					try:
-						os.killpg(self.p.pid, signal.SIGKILL)
-					except Exception:
-						try:
-							self.p.kill()
-						except Exception:
-							pass
-					self.close_stdout()
+	def signal(self, sig):
+		# the process group is sent `sig`, or if that's not possible, the process is terminated or,
+		# if `sig` is None or anything else, killed
+		if sig is not None:
+			try:
+				os.killpg(self.p.pid, sig)
+				return
+			except Exception:
+				pass
 
-		discarded = 0
 		try:
-			while True:
-				self.q.get_nowait()
-				discarded += 1
-		except gs.queue.Empty:
+			if sig == signal.SIGTERM:
+				self.p.terminate()
+			else:
+				self.p.kill()
+		except Exception:
 			pass
 
-		return discarded
-
 	def close_stdout(self):
 		try:
 			if self.p:
-				self.p.stdout.close()
+				supervisor().remove(self)
 		except Exception:
 			pass
 
 	def completed(self):
 		return self.return_code() is not None
 
-	def run(self):
+	def feed(self, s):
+		# called by the supervisor with the next chunk of output
+		if not self.output_started:
+			self.output_started = time.time()
+
+		l = (self.buf + s).split(b'\n')
+		self.buf = l.pop()
+		if l:
+			self.output([gs.ustr(ln).rstrip('\r') for ln in l])
+
+	def eof(self):
+		# called by the supervisor when the output ends, flushes the last partial line
+		s = self.buf
+		self.buf = b''
+		if s:
+			self.output([gs.ustr(s).rstrip('\r')])
+
+	def output(self, lines):
+		for ln in lines:
+			try:
+				self.on_output(self, ln)
+			except Exception:
+				gs.println(gs.traceback(DOMAIN))
+
+	def start(self):
+		# start() is usually called on the UI thread, and spawning the process can take a while
 		self.started = time.time()
-		tid = gs.begin(DOMAIN, self.message, set_status=False, cancel=self.cancel)
-		try:
+		self.tid = gs.begin(DOMAIN, self.message, set_status=False, cancel=self.cancel)
+		t = threading.Thread(target=self.spawn)
+		t.daemon = True
+		t.start()
+
+	def spawn(self):
+		if not self.cancelled:
 			try:
 				self.p = gs.popen(self.cmd, shell=self.shell, stderr=subprocess.STDOUT,
-					environ=self.env, cwd=self.cwd, bufsize=1)
-
-				CommandStdoutReader(self, self.p.stdout).start()
+					environ=self.env, cwd=self.cwd)
 			except Exception as ex:
 				self.x = ex
-			finally:
-				self.rcode = self.p.wait() if self.p else False
-		finally:
-			gs.end(tid)
-			self.ended = time.time()
+
+		if not self.p:
+			self.exited()
+			return
+
+		supervisor().add(self, [self.p.stdout])
+		if self.cancelled:
+			# cancel() was called before there was a process to signal
+			self.signal(signal.SIGTERM)
+
+	def exited(self):
+		# called by the supervisor once the command has exited, after the output it wrote was delivered
+		self.rcode = self.p.returncode if self.p else False
+		gs.end(self.tid)
+		self.ended = time.time()
+		try:
 			self.on_done(self)
+		except Exception:
+			gs.notice(DOMAIN, gs.traceback())
+
+		for f in self.done:
+			try:
+				f(self)
+			except Exception:
+				gs.notice(DOMAIN, gs.traceback())
 
-			for f in self.done:
-				try:
-					f(self)
-				except Exception:
-					gs.notice(DOMAIN, gs.traceback())
+		self.ended_evt.set()
+
+	def join(self, timeout=None):
+		self.ended_evt.wait(timeout)
+
+	def is_alive(self):
+		return bool(self.started) and not self.ended_evt.is_set()
 
 class ViewCommand(Command):
 	def __init__(self, cmd=[], shell=False, env={}, cwd=None, view=None):
@@ -255,6 +493,9 @@ class ViewCommand(Command):
 
 		self.output_done = []
 		self.show_summary = False
+		self.poll_lck = threading.Lock()
+		self.poll_pending = False
+		self.output_done_called = False
 
 		if not self.cwd and view is not None:
 			try:
@@ -262,7 +503,26 @@ class ViewCommand(Command):
 			except Exception:
 				self.cwd = None
 
+	def output(self, lines):
+		super(ViewCommand, self).output(lines)
+		self.schedule_poll()
+
+	def exited(self):
+		super(ViewCommand, self).exited()
+		self.schedule_poll()
+
+	def schedule_poll(self):
+		# output is inserted on the UI thread, once per batch rather than per line
+		with self.poll_lck:
+			if self.poll_pending:
+				return
+			self.poll_pending = True
+		sublime.set_timeout(self.poll_output, 0)
+
 	def poll_output(self):
+		with self.poll_lck:
+			self.poll_pending = False
+
 		l = []
 		try:
 			for i in range(500):
@@ -273,10 +533,11 @@ class ViewCommand(Command):
 		if l:
 			self.do_insert(l)
 
-		if self.completed() and self.q.qsize() == 0:
+		if self.q.qsize() != 0:
+			self.schedule_poll()
+		elif self.completed() and not self.output_done_called:
+			self.output_done_called = True
 			self.on_output_done()
-		else:
-			sublime.set_timeout(self.poll_output, 100)
 
 	def do_insert(self, lines):
 		if self.view is not None:
@@ -311,11 +572,15 @@ class ViewCommand(Command):
 			except Exception:
 				gs.notice(DOMAIN, gs.traceback())
 
-	def cancel(self):
-		discarded = super(ViewCommand, self).cancel()
-		t = ((time.time() - self.started), discarded)
-		self.on_output(self, ('\n[ cancelled: elapsed: %0.3fs, discarded %d line(s) ]\n' % t))
+	def cancel(self, cb=None):
+		def f(discarded):
+			t = ((time.time() - self.started), discarded)
+			self.output(['\n[ cancelled: elapsed: %0.3fs, discarded %d line(s) ]\n' % t])
+			if cb:
+				cb(discarded)
 
-	def run(self):
-		sublime.set_timeout(self.poll_output, 0)
-		super(ViewCommand, self).run()
+		super(ViewCommand, self).cancel(f)
+
+	def start(self):
+		self.schedule_poll()
+		super(ViewCommand, self).start()
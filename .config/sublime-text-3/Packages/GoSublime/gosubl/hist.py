@@ -0,0 +1,179 @@
+from gosubl import gs
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+
+DOMAIN = 'GsHist'
+
+_hists = {}
+_hists_lck = threading.Lock()
+
+def get(key):
+	with _hists_lck:
+		h = _hists.get(key)
+		if h is None:
+			fn = gs.home_path('9o', 'hist', '%s.log' % hashlib.sha1(key.encode('utf-8')).hexdigest())
+			h = _hists[key] = History(fn, key)
+		return h
+
+class History(object):
+	# The history is an append-only log with one JSON encoded command per line.
+	# Running a command again appends it again, the older entry goes stale:
+	# `pos` maps each command to its latest index in `log`, so an entry is live iff pos[log[i]] == i.
+	# The log is compacted (rewritten without stale entries) when they outnumber the live ones.
+
+	def __init__(self, fn, aso_key=''):
+		self.lck = threading.Lock()
+		self.fn = fn
+		self.log = []
+		self.pos = {}
+		self.sorted = []
+		self.recent_first = None
+		self.blob = None
+		self.load(aso_key)
+
+	def load(self, aso_key):
+		try:
+			with open(self.fn, 'r', encoding='utf-8') as f:
+				for ln in f:
+					cmd, _ = gs.json_decode(ln, u'')
+					self._add(cmd)
+		except FileNotFoundError:
+			# history used to be stored in the aux settings file, move it over
+			aso = gs.aso()
+			l = gs.dval(aso.get(aso_key), []) if aso_key else []
+			for cmd in l:
+				self._add(cmd)
+			if l:
+				aso.erase(aso_key)
+				gs.save_aso()
+			self.compact()
+		except Exception:
+			gs.error_traceback(DOMAIN)
+
+		self.sorted = sorted(self.pos)
+		self.maybe_compact()
+
+	def _add(self, cmd):
+		# returns None if `cmd` isn't a command, otherwise whether or not it's a new one
+		if not gs.is_a_string(cmd) or not cmd.strip():
+			return None
+
+		is_new = cmd not in self.pos
+		self.pos[cmd] = len(self.log)
+		self.log.append(cmd)
+		self.blob = None
+		return is_new
+
+	def _live(self, i):
+		return self.pos.get(self.log[i]) == i
+
+	def add(self, cmd):
+		with self.lck:
+			is_new = self._add(cmd)
+			if is_new is None:
+				return
+
+			if is_new:
+				bisect.insort(self.sorted, cmd)
+
+			try:
+				with open(self.fn, 'a', encoding='utf-8') as f:
+					f.write('%s\n' % json.dumps(cmd))
+			except Exception:
+				gs.error_traceback(DOMAIN)
+
+		self.maybe_compact()
+
+	def maybe_compact(self):
+		with self.lck:
+			if len(self.log) > 2 * len(self.pos) + 100:
+				self._compact()
+
+	def compact(self):
+		with self.lck:
+			self._compact()
+
+	def _compact(self):
+		live = [cmd for i, cmd in enumerate(self.log) if self._live(i)]
+		self.log = live
+		self.pos = dict((cmd, i) for i, cmd in enumerate(live))
+		try:
+			tmp_fn = '%s.tmp' % self.fn
+			with open(tmp_fn, 'w', encoding='utf-8') as f:
+				f.write(''.join('%s\n' % json.dumps(cmd) for cmd in live))
+			os.replace(tmp_fn, self.fn)
+		except Exception:
+			gs.error_traceback(DOMAIN)
+
+	def erase(self):
+		with self.lck:
+			self.log = []
+			self.pos = {}
+			self.sorted = []
+			self.blob = None
+			self._compact()
+
+	def __len__(self):
+		with self.lck:
+			return len(self.pos)
+
+	def __contains__(self, cmd):
+		with self.lck:
+			return cmd in self.pos
+
+	def all(self):
+		# oldest first
+		with self.lck:
+			return [cmd for i, cmd in enumerate(self.log) if self._live(i)]
+
+	def recent(self, n):
+		# the n'th most recent command, 1-based, as used by ^N
+		with self.lck:
+			i = len(self.log)
+			while n > 0 and i > 0:
+				i -= 1
+				if self._live(i):
+					n -= 1
+			return self.log[i] if n == 0 and i < len(self.log) else ''
+
+	def near(self, cmd, up):
+		# the command before (or after) `cmd`, None if there isn't one or `cmd` isn't in the history
+		with self.lck:
+			i = self.pos.get(cmd)
+			if i is None:
+				return None
+
+			step = -1 if up else 1
+			i += step
+			while 0 <= i < len(self.log):
+				if self._live(i):
+					return self.log[i]
+				i += step
+			return None
+
+	def prefix(self, pfx):
+		# all commands starting with `pfx`, sorted
+		with self.lck:
+			i = bisect.bisect_left(self.sorted, pfx)
+			j = i
+			while j < len(self.sorted) and self.sorted[j].startswith(pfx):
+				j += 1
+			return self.sorted[i:j]
+
+	def fuzzy(self, s):
+		# all commands containing the characters of `s` in order, ignoring case, most recent first.
+		# the commands are joined into one blob, a line per command prefixed by its index in recent_first,
+		# so a single regexp search finds them all
+		with self.lck:
+			if self.blob is None:
+				l = [cmd for i, cmd in enumerate(self.log) if self._live(i)]
+				l.reverse()
+				self.recent_first = l
+				self.blob = '\n'.join('%d\t%s' % (i, cmd.replace('\n', ' ')) for i, cmd in enumerate(l))
+
+			pat = re.compile(r'^(\d+)\t[^\n]*?%s' % '[^\n]*?'.join(re.escape(c) for c in s), re.MULTILINE | re.IGNORECASE)
+			return [self.recent_first[int(m.group(1))] for m in pat.finditer(self.blob)]
@@ -0,0 +1,174 @@
+from gosubl import gs
+import re
+import threading
+import time
+
+DOMAIN = 'GsJobs'
+EXIT_STATUS_PAT = re.compile(r'^exit status (\d+)$')
+
+# how many finished jobs are remembered
+KEEP_DONE = 100
+
+class Job(object):
+	def __init__(self, id, cmd, wd, background):
+		self.id = id
+		self.cmd = cmd
+		self.wd = wd
+		self.background = background
+		self.state = 'queued'
+		# the function that starts the job's command, it's set when the job is submitted
+		self.f = None
+		# the function that's called instead if the job is cancelled before it starts
+		self.on_cancel = None
+		# the gs task that represents the running command, if any
+		self.tid = ''
+		self.start = 0
+		self.end = 0
+		self.err = ''
+		self.waiters = []
+
+	def dur(self):
+		if not self.start:
+			return 0
+		return (self.end or time.time()) - self.start
+
+	def status(self):
+		# the command's exit status, or the error if it didn't run to completion
+		if self.state != 'done':
+			return ''
+		if not self.err:
+			return '0'
+		m = EXIT_STATUS_PAT.match(self.err)
+		return m.group(1) if m else self.err
+
+	def summary(self):
+		s = '#%d %s' % (self.id, self.state)
+		if self.start:
+			s = '%s %0.3fs' % (s, self.dur())
+		if self.state == 'done':
+			s = '%s, exit %s' % (s, self.status())
+		return '%s: %s' % (s, self.cmd)
+
+class Scheduler(object):
+	# Background jobs are started in order, while fewer than `9o_max_jobs` jobs are running.
+	# Foreground jobs start straight away but count towards the limit.
+
+	def __init__(self):
+		self.lck = threading.Lock()
+		self.jobs = []
+		self.next_id = 1
+
+	def add(self, cmd, wd, background):
+		with self.lck:
+			job = Job(self.next_id, cmd, wd, background)
+			self.next_id += 1
+
+			done = [j for j in self.jobs if j.state == 'done']
+			if len(done) >= KEEP_DONE:
+				old = set(done[:len(done) - KEEP_DONE + 1])
+				self.jobs = [j for j in self.jobs if j not in old]
+
+			self.jobs.append(job)
+			return job
+
+	def submit(self, job, f, on_cancel=None):
+		# `f` starts the job's command. it's called without the lock held, possibly from another thread,
+		# and done() must be called when the command ends. if the job is cancelled while it's queued,
+		# `on_cancel` is called instead
+		with self.lck:
+			job.f = f
+			job.on_cancel = on_cancel
+			l = self._ready(None if job.background else job)
+		self._start(l)
+
+	def fg(self, job):
+		# start `job` now if it's still queued, regardless of the limit
+		with self.lck:
+			l = self._ready(job)
+		self._start(l)
+
+	def cancel(self, job):
+		# drop `job` if it's still queued, it returns False if it already started
+		with self.lck:
+			if job.state != 'queued':
+				return False
+			# _ready() skips it from now on
+			job.f = None
+			f = job.on_cancel
+			job.on_cancel = None
+
+		self.done(job, 'cancelled')
+		if f:
+			try:
+				f()
+			except Exception:
+				gs.error_traceback(DOMAIN)
+		return True
+
+	def done(self, job, err=''):
+		with self.lck:
+			job.state = 'done'
+			job.end = time.time()
+			job.err = err
+			waiters = job.waiters
+			job.waiters = []
+			l = self._ready(None)
+		self._start(l)
+
+		for f in waiters:
+			try:
+				f()
+			except Exception:
+				gs.error_traceback(DOMAIN)
+
+	def wait(self, jobs, f):
+		# call `f` once all `jobs` are done
+		fired = []
+		def check():
+			with self.lck:
+				if fired or any(j.state != 'done' for j in jobs):
+					return
+				fired.append(True)
+			f()
+
+		with self.lck:
+			for j in jobs:
+				if j.state != 'done':
+					j.waiters.append(check)
+		check()
+
+	def get(self, id):
+		with self.lck:
+			for j in self.jobs:
+				if j.id == id:
+					return j
+		return None
+
+	def list(self, wd=None):
+		with self.lck:
+			return [j for j in self.jobs if wd is None or j.wd == wd]
+
+	def _limit(self):
+		return max(1, gs.setting('9o_max_jobs', 4) or 1)
+
+	def _ready(self, force):
+		running = sum(1 for j in self.jobs if j.state == 'running')
+		limit = self._limit()
+		l = []
+		for j in self.jobs:
+			if j.state != 'queued' or j.f is None:
+				continue
+			if j is force or running < limit:
+				j.state = 'running'
+				j.start = time.time()
+				running += 1
+				l.append(j)
+		return l
+
+	def _start(self, l):
+		for j in l:
+			try:
+				j.f()
+			except Exception:
+				gs.error_traceback(DOMAIN)
+				self.done(j, 'cannot start job: %s' % gs.traceback())
@@ -325,12 +325,26 @@ def calltip(fn, src, pos, quiet, f):
 
 	return acall('gocode_calltip', _complete_opts(fn, src, pos, True), cb)
 
+def complete_builtins():
+	return (gs.setting('autocomplete_builtins') is True or gs.setting('complete_builtins') is True)
+
 def complete(fn, src, pos):
-	builtins = (gs.setting('autocomplete_builtins') is True or gs.setting('complete_builtins') is True)
+	builtins = complete_builtins()
 	res, err = bcall('gocode_complete', _complete_opts(fn, src, pos, builtins))
 	res = gs.dval(res.get('Candidates'), [])
 	return res, err
 
+def acomplete(fn, src, pos, f):
+	# like bcall, don't queue requests that can't be answered until MarGo is installed
+	if _inst_state() != "done":
+		f([], 'Completion aborted: Install is not done')
+		return
+
+	def cb(res, err):
+		f(gs.dval(res.get('Candidates'), []), err)
+
+	return acall('gocode_complete', _complete_opts(fn, src, pos, complete_builtins()), cb)
+
 def _complete_opts(fn, src, pos, builtins):
 	nv = sh.env()
 	return {
@@ -689,6 +703,9 @@ def on(token, cb):
 	req = Request(f=cb, token=token)
 	gs.set_attr(REQUEST_PREFIX+req.token, req)
 
+def off(token):
+	gs.del_attr(REQUEST_PREFIX+token)
+
 def _dump(res, err):
 	gs.println(json.dumps({
 		'res': res,
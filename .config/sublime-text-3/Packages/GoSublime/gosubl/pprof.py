@@ -0,0 +1,87 @@
+from gosubl import gs
+from gosubl import sh
+import hashlib
+import os
+import re
+
+DOMAIN = 'GsPprof'
+
+ROUTINE_PAT = re.compile(r'^(ROUTINE =+ )(.+?) in (.+)$')
+TOP_ROW_PAT = re.compile(r'^(\s*(?:\S+\s+){5})(.+?) (\S+:\d+)((?: \(inline\))?)$')
+LIST_LINE_PAT = re.compile(r'^\s*(\S+)\s+(\S+)\s+(\d+):')
+VAL_PAT = re.compile(r'^([\d.]+)([a-zA-Z]*)$')
+
+UNITS = {
+	'ns': 1e-9,
+	'us': 1e-6,
+	'ms': 1e-3,
+	's': 1,
+	'mins': 60,
+	'hrs': 3600,
+	'B': 1,
+	'kB': 1 << 10,
+	'MB': 1 << 20,
+	'GB': 1 << 30,
+	'TB': 1 << 40,
+}
+
+def files(pkg):
+	# the test binary and the cpu and memory profiles for `pkg`.
+	# they're kept between runs so they can be inspected with `go tool pprof`
+	d, _ = gs.temp_dir('pprof')
+	nm = hashlib.sha1(pkg.encode('utf-8')).hexdigest()[:12]
+	return tuple(os.path.join(d, '%s.%s' % (nm, ext)) for ext in ('test', 'cpu.prof', 'mem.prof'))
+
+def _run(args):
+	cr = sh.go_cmd(gs.lst('tool', 'pprof', args)).run()
+	return '\n'.join(s for s in (cr.out.strip(), cr.err.strip(), cr.exc and str(cr.exc)) if s)
+
+def top(bin_fn, prof_fn, n):
+	# the `n` hottest lines in the profile, they're listed with their file:line so they can be opened from 9o
+	return paths_first(_run(['-top', '-lines', '-nodecount=%d' % n, bin_fn, prof_fn]))
+
+def paths_first(out):
+	# in 9o, function names like `main.(*T).foo` look like paths too and a click on a row opens the first one,
+	# so the file:line at the end of each `-top -lines` row is moved in front of the function
+	return '\n'.join(TOP_ROW_PAT.sub(r'\1\3 \2\4', ln) for ln in out.split('\n'))
+
+def listing(bin_fn, prof_fn, pat):
+	return mark_hot_lines(_run(['-list', pat, bin_fn, prof_fn]))
+
+def val(s):
+	# the value of a `-list` column, e.g. `10ms` or `1.50MB`, `.` is 0
+	m = VAL_PAT.match(s)
+	if not m:
+		return 0
+	try:
+		return float(m.group(1)) * UNITS.get(m.group(2), 1)
+	except ValueError:
+		return 0
+
+def mark_hot_lines(out):
+	# `-list` names each function's file, add the line with the highest cumulative value
+	# so that a click on the file jumps to the hot line. like in top(), the file is moved in front of the function
+	l = out.split('\n')
+	hdr = -1
+	hot = (0, '')
+	def mark():
+		if hdr >= 0:
+			m = ROUTINE_PAT.match(l[hdr])
+			fn = '%s:%s' % (m.group(3), hot[1]) if hot[1] else m.group(3)
+			l[hdr] = '%s%s %s' % (m.group(1), fn, m.group(2))
+
+	for i, ln in enumerate(l):
+		if ROUTINE_PAT.match(ln):
+			mark()
+			hdr = i
+			hot = (0, '')
+			continue
+
+		m = LIST_LINE_PAT.match(ln)
+		if m and hdr >= 0:
+			v = val(m.group(2))
+			if v > hot[0]:
+				hot = (v, m.group(3))
+	mark()
+
+	return '\n'.join(l)
@@ -4,10 +4,14 @@ from . import gs
 from collections import namedtuple
 import os
 import re
+import select
+import signal
 import string
 import sublime
 import subprocess
+import threading
 import time
+import uuid
 
 try:
 	STARTUPINFO = subprocess.STARTUPINFO()
@@ -17,7 +21,7 @@ except (AttributeError):
 	STARTUPINFO = None
 
 Proc = namedtuple('Proc', 'p input orig_cmd cmd_lst env wd ok exc')
-Result = namedtuple('Result', 'out cmd_lst err ok exc')
+Result = namedtuple('Result', 'out cmd_lst err ok exc code')
 psep = os.pathsep
 
 class _command(object):
@@ -54,12 +58,7 @@ class _command(object):
 		err = ''
 		exc = None
 
-		nv0 = {}
-		for k in self.env:
-			nv0[gs.astr(k)] = gs.astr(self.env[k])
-
-		nv = env(nv0)
-		nv.update(nv0)
+		nv = self.environ()
 		cmd_lst = self.cmd(nv)
 		orig_cmd = cmd_lst[0]
 		cmd_lst[0] = _which(orig_cmd, nv.get('PATH'))
@@ -95,6 +94,15 @@ class _command(object):
 			exc=exc
 		)
 
+	def environ(self):
+		nv0 = {}
+		for k in self.env:
+			nv0[gs.astr(k)] = gs.astr(self.env[k])
+
+		nv = env(nv0)
+		nv.update(nv0)
+		return nv
+
 	def run(self):
 		out = ''
 		err = ''
@@ -116,7 +124,8 @@ class _command(object):
 			err=gs.ustr(err),
 			cmd_lst=pr.cmd_lst,
 			ok=(not exc),
-			exc=exc
+			exc=exc,
+			code=(pr.p.returncode if pr.p else None)
 		)
 
 class ShellCommand(_command):
@@ -127,6 +136,212 @@ class ShellCommand(_command):
 	def cmd(self, e):
 		return _cmd(self.cmd_str, e)
 
+	def run(self):
+		if gs.setting('shell_coproc') is True and not self.input:
+			cr = _coproc.run(self)
+			if cr is not None:
+				return cr
+
+		return _command.run(self)
+
+class Coproc(object):
+	# Coproc is a long-lived shell that runs ShellCommands, so the shell (and its profile)
+	# isn't started anew for each of them. Each command is sent as
+	#
+	#	( cd WD && export K=V... && eval 'CMD' ) </dev/null; printf 'TOKEN%d\n' $?; printf 'TOKEN\n' >&2
+	#
+	# and its stdout and stderr are read up to TOKEN. The command runs in a subshell so it can't change
+	# the shell's state. Only one command runs at a time, run() returns None if the shell is busy
+	# or can't be used, and the command should be run the usual way.
+
+	def __init__(self):
+		self.lck = threading.Lock()
+		self.p = None
+		self.shl = []
+		self.env = {}
+		self.token = ('GS.COPROC.%s.' % uuid.uuid4()).encode('ascii')
+
+	def shell(self, e):
+		# only the default shell is used, custom `shell` settings might not be POSIX shells
+		if gs.os_is_windows() or gs.setting('shell'):
+			return []
+
+		fn = e.get('SHELL') or 'sh'
+		name, _ = os.path.splitext(os.path.basename(fn))
+		if name not in COPROC_SHELLS:
+			return []
+		return [fn, '-l', '-s']
+
+	def run(self, c):
+		if not self.lck.acquire(False):
+			return None
+
+		try:
+			return self._run(c)
+		finally:
+			self.lck.release()
+
+	def _run(self, c):
+		nv = c.environ()
+		shl = self.shell(nv)
+		if not shl:
+			return None
+
+		cmd_lst = _cmd(c.cmd_str, nv)
+		if self.p is None or self.p.poll() is not None or self.shl != shl:
+			self.start(shl, nv)
+			if self.p is None:
+				return None
+
+		# the shell was started with self.env, only the differences are passed to the command
+		vars = []
+		for k, v in nv.items():
+			if self.env.get(k) != v:
+				vars.append((k, v))
+		if any(not COPROC_VAR_PAT.match(k) for k, _ in vars):
+			return None
+
+		# commands run the usual way start in the current directory, not the one the shell started in
+		wd = c.wd or os.getcwd()
+		if c.wd:
+			try:
+				os.makedirs(wd)
+			except Exception:
+				pass
+
+		l = ['cd %s' % _quote(wd)]
+		if vars:
+			l.append('export %s' % ' '.join('%s=%s' % (k, _quote(v)) for k, v in vars))
+		for k in self.env:
+			if k not in nv and COPROC_VAR_PAT.match(k):
+				l.append('unset %s' % k)
+		l.append('eval %s' % _quote(c.cmd_str))
+
+		try:
+			code, out, err = self.send(' && '.join(l))
+			return Result(out=gs.ustr(out), err=gs.ustr(err), cmd_lst=cmd_lst, ok=True, exc=None, code=code)
+		except Exception as ex:
+			# the shell died, got out of sync or got stuck, it's restarted by the next command
+			self.stop()
+			return Result(out='', err='', cmd_lst=cmd_lst, ok=False, exc=ex, code=None)
+
+	def start(self, shl, e):
+		self.stop()
+		try:
+			self.shl = shl
+			self.env = e
+			self.p = subprocess.Popen(
+				shl,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.PIPE,
+				stdin=subprocess.PIPE,
+				startupinfo=STARTUPINFO,
+				shell=False,
+				env=e,
+				preexec_fn=os.setsid,
+				bufsize=0
+			)
+			# skip anything printed by the shell's profile
+			self.send('true', COPROC_START_TIMEOUT)
+		except Exception:
+			_print('cannot start the shell coprocess: %s' % gs.traceback())
+			self.stop()
+
+	def stop(self):
+		p = self.p
+		self.p = None
+		if p is not None:
+			# the shell was started in its own session, so this also kills the command it's running
+			try:
+				os.killpg(p.pid, signal.SIGKILL)
+			except Exception:
+				try:
+					p.kill()
+				except Exception:
+					pass
+			try:
+				p.wait()
+			except Exception:
+				pass
+			for f in (p.stdin, p.stdout, p.stderr):
+				try:
+					f.close()
+				except Exception:
+					pass
+
+	def send(self, cmd_str, timeout=None):
+		# returns the exit code, stdout and stderr of `cmd_str`.
+		# if it doesn't finish within `timeout` (COPROC_TIMEOUT by default) seconds, TimeoutError is raised
+		deadline = time.time() + (timeout or COPROC_TIMEOUT)
+		tok = self.token.decode('ascii')
+		s = "( %s ) </dev/null; printf '%s%%d\\n' $?; printf '%s\\n' >&2\n" % (cmd_str, tok, tok)
+		self.p.stdin.write(s.encode('utf-8'))
+		self.p.stdin.flush()
+
+		out_fd = self.p.stdout.fileno()
+		err_fd = self.p.stderr.fileno()
+		bufs = {out_fd: b'', err_fd: b''}
+		ends = {}
+		while len(ends) < 2:
+			dur = deadline - time.time()
+			rl = []
+			if dur > 0:
+				rl, _, _ = select.select([fd for fd in bufs if fd not in ends], [], [], dur)
+			if not rl:
+				raise TimeoutError('the command didn\'t finish within %ds' % (timeout or COPROC_TIMEOUT))
+
+			for fd in rl:
+				s = os.read(fd, 64 * 1024)
+				if not s:
+					raise EOFError('the shell exited')
+
+				bufs[fd] += s
+				i = bufs[fd].find(self.token)
+				if i >= 0:
+					j = bufs[fd].find(b'\n', i)
+					if j >= 0:
+						ends[fd] = (i, j)
+
+		i, j = ends[out_fd]
+		out = bufs[out_fd]
+		code = int(out[i+len(self.token):j])
+		if out[j+1:] or bufs[err_fd][ends[err_fd][1]+1:]:
+			raise EOFError('unexpected output after the end of the command')
+
+		return code, out[:i], bufs[err_fd][:ends[err_fd][0]]
+
+def _quote(s):
+	return "'%s'" % s.replace("'", "'\\''")
+
+COPROC_SHELLS = ('sh', 'bash', 'zsh', 'dash', 'ksh')
+# how long, in seconds, a command can run in the shell and how long the shell's profile can take to load,
+# after that the shell is assumed to be stuck and is killed
+COPROC_TIMEOUT = 300
+COPROC_START_TIMEOUT = 10
+COPROC_VAR_PAT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_coproc = Coproc()
+
+def bench_coproc(n=20):
+	# compare running `true` through a new shell each time with running it through the coprocess
+	c = ShellCommand('true')
+	with _coproc.lck:
+		if not _coproc.shell(c.environ()):
+			return 'the shell coprocess only works with the default (sh, bash, zsh, dash or ksh) shell'
+
+		# the first command starts the coprocess
+		_coproc._run(c)
+
+		l = []
+		for name, f in (('spawn', lambda: _command.run(c)), ('coproc', lambda: _coproc._run(c))):
+			start = time.time()
+			for i in range(n):
+				cr = f()
+				if cr.exc:
+					return '%s: %s' % (name, cr.exc)
+			dur = time.time() - start
+			l.append('%s: %d runs in %0.3fs, %0.1fms/run' % (name, n, dur, 1000 * dur / n))
+		return '\n'.join(l)
+
 class Command(_command):
 	def __init__(self, cmd_lst):
 		_command.__init__(self)
@@ -0,0 +1,231 @@
+from gosubl import gs
+from gosubl import sh
+import json
+import os
+import threading
+
+DOMAIN = 'GsTestCache'
+
+# The cache records the outcome of `go test -json` runs per package (by import path):
+#
+#	{"pkgs": {"IMPORT_PATH": {
+#		"ok": bool,
+#		"dur": seconds,
+#		"green": the time of the last run the package passed in,
+#		"tests": {"TEST_NAME": {"ok": bool, "dur": seconds}},
+#	}}}
+
+_lck = threading.Lock()
+_cache = None
+
+def _fn():
+	return gs.home_path('9o', 'test', 'cache.json')
+
+def _load():
+	global _cache
+	if _cache is None:
+		_cache = {}
+		try:
+			with open(_fn(), 'r', encoding='utf-8') as f:
+				_cache, _ = gs.json_decode(f.read(), {})
+		except FileNotFoundError:
+			pass
+		except Exception:
+			gs.error_traceback(DOMAIN)
+	return _cache.setdefault('pkgs', {})
+
+def _save():
+	try:
+		tmp_fn = '%s.tmp' % _fn()
+		with open(tmp_fn, 'w', encoding='utf-8') as f:
+			json.dump(_cache, f)
+		os.replace(tmp_fn, _fn())
+	except Exception:
+		gs.error_traceback(DOMAIN)
+
+class Parser(object):
+	# turns the output of `go test -json` into plain output as it arrives, collecting the test events.
+	# lines that aren't events (e.g. build errors on stderr) are kept as-is
+
+	def __init__(self):
+		self.events = []
+		self.rest = ''
+
+	def feed(self, s):
+		# returns the plain output of the lines completed by `s`
+		l = (self.rest + s).split('\n')
+		self.rest = l.pop()
+		return ''.join(self.line(ln) for ln in l)
+
+	def flush(self):
+		# returns the plain output of the last line if it wasn't terminated
+		ln, self.rest = self.rest, ''
+		return self.line(ln) if ln else ''
+
+	def line(self, ln):
+		ev = None
+		if ln.startswith('{'):
+			ev, err = gs.json_decode(ln, {})
+			if err:
+				ev = None
+
+		if ev is None:
+			return '%s\n' % ln
+
+		self.events.append(ev)
+		if ev.get('Action') == 'output':
+			return ev.get('Output', '')
+		return ''
+
+def record(events, start, partial=False):
+	# record the results in `events`. `start` is the time the run started,
+	# changes made after it aren't covered by the results.
+	# if `partial` is true, only some of the tests were run so only the tests' results are recorded
+	res = {}
+	for ev in events:
+		act = ev.get('Action')
+		if act not in ('pass', 'fail', 'skip'):
+			continue
+
+		p = res.setdefault(ev.get('Package', ''), {'tests': {}})
+		r = {'ok': act != 'fail', 'dur': ev.get('Elapsed', 0)}
+		if ev.get('Test'):
+			p['tests'][ev['Test']] = r
+		else:
+			p.update(r)
+
+	with _lck:
+		pkgs = _load()
+		for k, p in res.items():
+			if not k or 'ok' not in p:
+				continue
+
+			c = pkgs.setdefault(k, {})
+			c.setdefault('tests', {}).update(p['tests'])
+			if partial:
+				continue
+
+			c['ok'] = p['ok']
+			c['dur'] = p['dur']
+			if p['ok']:
+				c['green'] = start
+		_save()
+
+	return res
+
+def summary(res):
+	n = 0
+	failed = []
+	for k in sorted(res):
+		for name, r in sorted(res[k]['tests'].items()):
+			n += 1
+			if not r['ok']:
+				failed.append('%s.%s' % (k, name))
+
+	s = '%d tests, %d failed' % (n, len(failed))
+	if failed:
+		s = '%s:\n%s' % (s, '\n'.join('\t%s' % t for t in failed))
+	return s
+
+def root(dir):
+	# the directory of the module that contains `dir`, or `dir` itself outside of modules
+	d = dir
+	while True:
+		if os.path.exists(os.path.join(d, 'go.mod')):
+			return d
+		p = os.path.dirname(d)
+		if p == d:
+			return dir
+		d = p
+
+def list_pkgs(dir):
+	# `go list -deps -json ./...` in dir, the output is a stream of JSON objects
+	cmd = sh.go_cmd(['list', '-e', '-deps', '-json', './...'])
+	cmd.wd = dir
+	cr = cmd.run()
+	if not cr.ok:
+		return [], str(cr.exc)
+
+	l = []
+	dec = json.JSONDecoder()
+	s = cr.out.strip()
+	i = 0
+	try:
+		while i < len(s):
+			p, i = dec.raw_decode(s, i)
+			l.append(p)
+			while i < len(s) and s[i].isspace():
+				i += 1
+	except ValueError as ex:
+		return [], '%s\n%s' % (ex, cr.err.strip())
+
+	return l, ''
+
+def _mtime(p):
+	mt = 0
+	d = p.get('Dir', '')
+	for k in ('GoFiles', 'CgoFiles', 'TestGoFiles', 'XTestGoFiles'):
+		for fn in p.get(k) or []:
+			try:
+				mt = max(mt, os.path.getmtime(os.path.join(d, fn)))
+			except OSError:
+				pass
+	return mt
+
+def roots(l):
+	# the packages matched by ./..., as opposed to their dependencies
+	return [p['ImportPath'] for p in l if not p.get('DepOnly') and not p.get('Standard')]
+
+def affected(dir, l):
+	# the packages in `l` (as returned by list_pkgs(dir)) that didn't pass,
+	# or depend on packages that changed since they last passed
+	m = dict((p['ImportPath'], p) for p in l)
+	mtimes = {}
+	def mtime(k):
+		if k not in mtimes:
+			p = m.get(k)
+			# only packages in the tree are expected to change
+			if p is None or p.get('Standard') or not p.get('Dir', '').startswith(dir):
+				mtimes[k] = 0
+			else:
+				mtimes[k] = _mtime(p)
+		return mtimes[k]
+
+	try:
+		mod_mt = os.path.getmtime(os.path.join(dir, 'go.mod'))
+	except OSError:
+		mod_mt = 0
+
+	with _lck:
+		pkgs = _load()
+		green = dict((k, pkgs.get(k, {}).get('green', 0)) for k in roots(l))
+
+	res = []
+	for k, g in sorted(green.items()):
+		p = m[k]
+		deps = [k]
+		deps.extend(p.get('Deps') or [])
+		for t in (p.get('TestImports') or []) + (p.get('XTestImports') or []):
+			deps.append(t)
+			deps.extend(m.get(t, {}).get('Deps') or [])
+		if mod_mt > g or any(mtime(d) > g for d in deps):
+			res.append(k)
+	return res
+
+def failed(pkgs):
+	# the top-level tests in `pkgs` that failed in their last run
+	res = {}
+	with _lck:
+		c = _load()
+		for k in pkgs:
+			l = set(name.split('/')[0] for name, r in c.get(k, {}).get('tests', {}).items() if not r['ok'])
+			if l:
+				res[k] = sorted(l)
+	return res
+
+def slowest(pkgs):
+	# `pkgs` ordered by their last run's duration, packages that haven't run are assumed to be slow
+	with _lck:
+		c = _load()
+		dur = dict((k, c.get(k, {}).get('dur')) for k in pkgs)
+	return sorted(pkgs, key=lambda k: (dur[k] is not None, -(dur[k] or 0), k))
@@ -1,9 +1,14 @@
 from gosubl import about
+from gosubl import bench
 from gosubl import gs
 from gosubl import gsq
 from gosubl import gsshell
+from gosubl import hist
+from gosubl import jobs
 from gosubl import mg9
+from gosubl import pprof
 from gosubl import sh
+from gosubl import testcache
 import datetime
 import json
 import os
@@ -12,6 +17,8 @@ import shlex
 import string
 import sublime
 import sublime_plugin
+import threading
+import time
 import uuid
 import webbrowser
 
@@ -21,9 +28,16 @@ SPLIT_FN_POS_PAT = re.compile(r'(.+?)(?:[:](\d+))?(?:[:](\d+))?$')
 URL_SCHEME_PAT = re.compile(r'^[\w.+-]+://')
 URL_PATH_PAT = re.compile(r'^(?:[\w.+-]+://|(?:www|(?:\w+\.)*(?:golang|pkgdoc|gosublime)\.org))')
 HIST_EXPAND_PAT = re.compile(r'^(\^+)\s*(\d+)$')
+TEST_FILTER_PAT = re.compile(r'^--?(?:test\.)?(?:run|skip)(?:=|$)')
 
 HOURGLASS = u'\u231B'
 
+# how often streamed output is inserted into the view
+STREAM_INTERVAL_MS = 50
+# how much of it is inserted at a time, the rest waits for the next interval
+STREAM_FLUSH_LIMIT = 64 * 1024
+STREAM_DOMAIN = '%s.stream' % DOMAIN
+
 DEFAULT_COMMANDS = [
 	'help',
 	'run',
@@ -55,11 +69,22 @@ DEFAULT_COMMANDS = [
 	'hist',
 	'hist erase',
 	'cd',
+	'jobs',
+	'wait',
+	'fg',
+	'bench',
+	'pprof',
+	'test',
+	'shbench',
 ]
 DEFAULT_CL = [(s, s+' ') for s in DEFAULT_COMMANDS]
 
 stash = {}
 tid_alias = {}
+streams = {}
+scheduler = jobs.Scheduler()
+# the command line and whether or not it ends with `&`, for the job started by the command being executed
+job_args = {}
 
 def active_wd(win=None):
 	_, v = gs.win_view(win=win)
@@ -84,18 +109,43 @@ class EV(sublime_plugin.EventListener):
 		if view.score_selector(pos, 'text.9o') == 0:
 			return []
 
-		cl = set()
+		h = hist.get(_hkey(view.settings().get('9o.wd', '')))
+		return (_completions.complete(h, prefix), AC_OPTS)
+
+def cl_esc(e):
+	return (e[0], e[1].replace('$', '\\$'))
 
-		hkey = _hkey(view.settings().get('9o.wd', ''))
-		cl.update((k, k+' ') for k in gs.dval(gs.aso().get(hkey), []))
-		cl.update((k, k+' ') for k in aliases())
+class CompletionIndex(object):
+	# The aliases, builtins and DEFAULT_CL completions. They're only rebuilt when the aliases
+	# or gs.gs9o builtins change, history completions come from the history's fuzzy lookup.
+	def __init__(self):
+		self.aliases = None
+		self.builtins = None
+		self.cl = []
+
+	def refresh(self):
+		am = gs.setting('9o_aliases', {})
+		bk = frozenset(gs.gs9o)
+		if am == self.aliases and bk == self.builtins:
+			return
+
+		self.aliases = dict(am)
+		self.builtins = bk
+		cl = set((k, k+' ') for k in am)
 		cl.update((k, k+' ') for k in builtins())
 		cl.update(DEFAULT_CL)
+		self.cl = sorted(cl_esc(e) for e in cl)
 
-		return ([cl_esc(e) for e in sorted(cl)], AC_OPTS)
+	def complete(self, h, prefix):
+		self.refresh()
+		# the same case-insensitive, in-order matching as the popup, so nothing it would show is dropped
+		pat = re.compile('.*?'.join(re.escape(c) for c in prefix), re.IGNORECASE)
+		cl = set(e for e in self.cl if pat.search(e[0]))
+		# the popup matches fuzzily, so offer every command it could show
+		cl.update(cl_esc((k, k+' ')) for k in h.fuzzy(prefix))
+		return sorted(cl)
 
-def cl_esc(e):
-	return (e[0], e[1].replace('$', '\\$'))
+_completions = CompletionIndex()
 
 class Gs9oBuildCommand(sublime_plugin.WindowCommand):
 	def is_enabled(self):
@@ -126,33 +176,24 @@ class Gs9oMoveHist(sublime_plugin.TextCommand):
 		if view.score_selector(pos, 'prompt.9o') <= 0:
 			return
 
-		aso = gs.aso()
 		vs = view.settings()
 		wd = vs.get('9o.wd')
-		hkey = _hkey(wd)
-		hist = [s for s in gs.dval(aso.get(hkey), []) if s.strip()]
-		if not hist:
+		h = hist.get(_hkey(wd))
+		if not len(h):
 			return
 
 		r = view.extract_scope(pos)
 		cmd = view.substr(r).strip('#').strip()
-		try:
-			idx = hist.index(cmd) + (-1 if up else 1)
-			found = True
-		except Exception:
-			idx = -1
-			found = False
-
+		found = cmd in h
 		if cmd and not found:
-			hist.append(cmd)
-			aso.set(hkey, hist)
-			gs.save_aso()
+			h.add(cmd)
 
-		if idx >= 0 and idx < len(hist):
-			cmd = hist[idx]
+		s = h.near(cmd, up) if found else None
+		if s is not None:
+			cmd = s
 		elif up:
 			if not found:
-				cmd = hist[-1]
+				cmd = h.recent(1)
 		else:
 			cmd = ''
 
@@ -373,30 +414,18 @@ class Gs9oExecCommand(sublime_plugin.TextCommand):
 			cmd = ln[1].strip()
 			if cmd:
 				vs = view.settings()
-				aso = gs.aso()
-				hkey = _hkey(wd)
-				hist = gs.dval(aso.get(hkey), [])
+				h = hist.get(_hkey(wd))
 
 				m = HIST_EXPAND_PAT.match(cmd)
 				if m:
 					pfx = m.group(1)
-					hl = len(hist)
-					idx = hl - int(m.group(2))
-					cmd = ''
-					if idx >= 0 and idx < hl:
-						cmd = hist[idx]
+					cmd = h.recent(int(m.group(2)))
 
 					if pfx == '^' or not cmd:
 						view.replace(edit, line, ('%s# %s' % (ln[0], cmd)))
 						return
 				elif save_hist:
-					try:
-						hist.remove(cmd)
-					except ValueError:
-						pass
-					hist.append(cmd)
-					aso.set(hkey, hist)
-					gs.save_aso()
+					h.add(cmd)
 
 			if not cmd:
 				view.run_command('gs9o_init')
@@ -407,6 +436,11 @@ class Gs9oExecCommand(sublime_plugin.TextCommand):
 			view.add_regions(rkey, [sublime.Region(line.begin(), view.size())], '')
 			view.run_command('gs9o_init')
 
+			bg = cmd.endswith('&') and not cmd.endswith('&&')
+			if bg:
+				cmd = cmd[:-1].rstrip()
+			job_args[rkey] = (cmd, bg)
+
 			nv = sh.env()
 			anv = nv.copy()
 			seen = {}
@@ -439,6 +473,7 @@ class Gs9oExecCommand(sublime_plugin.TextCommand):
 						args = [_exparg(s, nv) for s in shlex.split(gs.astr(ag))]
 
 					f(view, edit, args, wd, rkey)
+					job_args.pop(rkey, None)
 					return
 
 			if nm == 'sh':
@@ -447,14 +482,22 @@ class Gs9oExecCommand(sublime_plugin.TextCommand):
 				args = sh.cmd(cmd)
 
 			cmd_sh(view, edit, args, wd, rkey)
+			job_args.pop(rkey, None)
 		else:
 			view.insert(edit, gs.sel(view).begin(), '\n')
 
 class Gs9oPushOutput(sublime_plugin.TextCommand):
 	def run(self, edit, rkey, output, hourglass_repl=''):
 		view = self.view
-		output = '\t%s' % gs.ustr(output).strip().replace('\r', '').replace('\n', '\n\t')
+		output, dropped = _truncate(gs.ustr(output).strip().replace('\r', ''), _scrollback_limit())
+		output = '\t%s' % output.replace('\n', '\n\t')
+		if dropped:
+			output = '%s\n%s' % (_truncated_marker(dropped), output)
+
 		regions = view.get_regions(rkey)
+		streamed = view.get_regions(rkey+'.out')
+		view.erase_regions(rkey+'.out')
+		streams.pop(rkey, None)
 		if regions:
 			line = view.line(regions[0].begin())
 			lsrc = view.substr(line).replace(HOURGLASS, (hourglass_repl or '| done'))
@@ -462,7 +505,9 @@ class Gs9oPushOutput(sublime_plugin.TextCommand):
 			r = line
 			if output.strip():
 				line = view.line(regions[0].begin())
-				view.insert(edit, line.end(), '\n%s' % output)
+				# anything that was streamed comes before the rest of the output
+				pos = streamed[0].end() if streamed else line.end()
+				view.insert(edit, pos, '\n%s' % output)
 				r = view.get_regions(rkey)[0]
 		else:
 			n = view.size()
@@ -474,11 +519,54 @@ class Gs9oPushOutput(sublime_plugin.TextCommand):
 		else:
 			view.show(r.begin())
 
+class Gs9oStreamOutput(sublime_plugin.TextCommand):
+	def run(self, edit, rkey, output, dropped=0):
+		view = self.view
+		st = streams.get(rkey)
+		regions = view.get_regions(rkey)
+		if st is None or not regions:
+			return
+
+		limit = _scrollback_limit()
+		output, n = _truncate(output.replace('\r', ''), limit)
+		dropped += n
+		if output.endswith('\n'):
+			output = output[:-1]
+		output = '\n\t%s' % output.replace('\n', '\n\t')
+
+		okey = rkey+'.out'
+		out = view.get_regions(okey)
+		if out:
+			begin, end = out[0].begin(), out[0].end()
+		else:
+			begin = end = view.line(regions[0].begin()).end()
+		end += view.insert(edit, end, output)
+
+		# the oldest lines are dropped to keep the command's output within the limit
+		cut = begin + len(st.marker)
+		if limit > 0 and end - cut > limit:
+			r = view.find('\n', end - limit, sublime.LITERAL)
+			if r is not None and 0 <= r.begin() < end:
+				dropped += r.begin() - cut
+				cut = r.begin()
+
+		if dropped:
+			st.truncated += dropped
+			marker = '\n%s' % _truncated_marker(st.truncated)
+			end += len(marker) - (cut - begin)
+			view.replace(edit, sublime.Region(begin, cut), marker)
+			st.marker = marker
+
+		view.add_regions(okey, [sublime.Region(begin, end)], '')
+		if gs.setting('9o_show_end') is True:
+			view.show(end)
+
 class Gs9oRunManyCommand(sublime_plugin.TextCommand):
 	def run(self, edit, wd=None, commands=[], save_hist=False, focus_view=False):
+		# the commands are independent, so they're run as background jobs, `9o_max_jobs` at a time
 		for run in commands:
 			self.view.run_command("gs9o_open", {
-				'run': run,
+				'run': gs.lst(run, '&'),
 				'wd': wd,
 				'save_hist': save_hist,
 				'focus_view': focus_view,
@@ -499,6 +587,106 @@ def builtins():
 
 	return m
 
+def _scrollback_limit():
+	return gs.setting('9o_scrollback_limit', 0) or 0
+
+def _truncate(s, limit):
+	# keep whole lines from the end of `s`, at most `limit` chars of them
+	if limit <= 0 or len(s) <= limit:
+		return s, 0
+
+	i = s.find('\n', len(s) - limit)
+	if i < 0:
+		return '', len(s)
+	return s[i+1:], i+1
+
+def _truncated_marker(n):
+	return '\t[ %d characters truncated, see the `9o_scrollback_limit` setting ]' % n
+
+class _Stream(object):
+	# output arrives on the margo thread, it's collected here and inserted
+	# into the view at most every STREAM_INTERVAL_MS, STREAM_FLUSH_LIMIT chars at a time.
+	# if `filter` is set, the output is passed through it, in order, on the STREAM_DOMAIN queue
+	def __init__(self, view, rkey, filter=None):
+		self.view = view
+		self.rkey = rkey
+		self.filter = filter
+		self.token = '9o.stream.%s' % uuid.uuid4()
+		self.lck = threading.Lock()
+		self.buf = []
+		self.pending = False
+		self.repls = []
+		self.truncated = 0
+		self.marker = ''
+		streams[rkey] = self
+
+	def recv(self, res, err):
+		if res.get('tmpFn'):
+			self.repls = _tmp_fn_repls(res)
+
+		s = self.repl(''.join(res.get(k) or '' for k in ('out', 'err')))
+		if s:
+			if self.filter:
+				gsq.dispatch(STREAM_DOMAIN, lambda: self.put(self.filter(s)))
+			else:
+				self.put(s)
+
+		return True
+
+	def put(self, s):
+		if s:
+			with self.lck:
+				self.buf.append(s)
+				self.schedule()
+
+	def schedule(self):
+		# called with the lock held
+		if not self.pending:
+			self.pending = True
+			sublime.set_timeout(self.tick, STREAM_INTERVAL_MS)
+
+	def tick(self):
+		with self.lck:
+			self.pending = False
+		self.flush()
+
+	def repl(self, s):
+		for a, b in self.repls:
+			s = s.replace(a, b)
+		return s
+
+	def flush(self):
+		# flush() returns True if there's more output to insert
+		with self.lck:
+			# output that's beyond the scrollback limit isn't worth inserting
+			s, dropped = _truncate(''.join(self.buf), _scrollback_limit())
+			n = len(s)
+			if n > STREAM_FLUSH_LIMIT:
+				# whole lines, unless a line is longer than the limit
+				n = s.rfind('\n', 0, STREAM_FLUSH_LIMIT) + 1 or STREAM_FLUSH_LIMIT
+			self.buf = [s[n:]] if n < len(s) else []
+			more = bool(self.buf)
+			if more:
+				self.schedule()
+			s = s[:n]
+
+		if s or dropped:
+			self.view.run_command('gs9o_stream_output', {
+				'rkey': self.rkey,
+				'output': s,
+				'dropped': dropped,
+			})
+		return more
+
+def _tmp_fn_repls(res):
+	tmp_fn = res.get('tmpFn')
+	fn = res.get('fn')
+	if not fn or not tmp_fn:
+		return []
+
+	bfn = os.path.basename(tmp_fn)
+	return [(s, fn) for s in ('./%s' % bfn, '.\\%s' % bfn, tmp_fn)]
+
 def push_output(view, rkey, output, hourglass_repl=''):
 	def f():
 		view.run_command('gs9o_push_output', {
@@ -519,36 +707,82 @@ def _save_all(win, wd):
 			except Exception:
 				gs.error_traceback(DOMAIN)
 
-def _9_begin_call(name, view, edit, args, wd, rkey, cid):
+def _9_call(name, view, edit, args, wd, rkey, cid, method, a, fmt=None, filter=None):
+	# run MarGo's `method` as a 9o job. `cid` and the stream token are added to `a`.
+	# if `fmt` is set, the output isn't streamed, it's replaced by fmt(out, err) when the command ends.
+	# if `filter` is set too, the output is streamed through filter(s), and fmt(out, err)
+	# gets what's left once all of it was filtered
+	cmd, bg = job_args.pop(rkey, ('%s %s' % (name, ' '.join(args)), False))
+	job = scheduler.add(cmd, wd, bg)
+
 	dmn = '%s: 9 %s' % (DOMAIN, name)
 	msg = '[ %s ] # 9 %s' % (gs.simple_fn(wd), ' '.join(args))
 	if not cid:
 		cid = '9%s-%s' % (name, uuid.uuid4())
-	tid = gs.begin(dmn, msg, set_status=False, cancel=lambda: mg9.acall('kill', {'cid': cid}, None))
-	tid_alias['%s-%s' % (name, wd)] = tid
+	elif bg:
+		# background jobs run alongside each other instead of replacing the last one
+		cid = '%s-%d' % (cid, job.id)
+
+	st = _Stream(view, rkey, filter)
+	stream = filter or not fmt
+	a['cid'] = cid
+	a['stream'] = st.token if stream else ''
+
+	def start():
+		try:
+			job.tid = gs.begin(dmn, msg, set_status=False, cancel=lambda: mg9.acall('kill', {'cid': cid}, None))
+			tid_alias['%s-%s' % (name, wd)] = job.tid
+			if stream:
+				mg9.on(st.token, st.recv)
+			mg9.acall(method, a, cb)
+		except Exception:
+			gs.error_traceback(dmn)
+			# the scheduler only sees the job being scheduled, it must still be told that it ended
+			cb({}, 'cannot start job: %s' % gs.traceback())
 
 	def cb(res, err):
+		mg9.off(st.token)
+		scheduler.done(job, err)
+
+		# when the output is streamed, `out` and `err` are empty
 		out = '\n'.join(s for s in (res.get('out'), res.get('err'), err) if s)
+		for a, b in _tmp_fn_repls(res):
+			out = out.replace(a, b)
 
-		tmp_fn = res.get('tmpFn')
-		fn = res.get('fn')
-		if fn and tmp_fn:
-			bfn = os.path.basename(tmp_fn)
-			repls = [
-				'./%s' % bfn,
-				'.\\%s' % bfn,
-				tmp_fn,
-			]
-			for s in repls:
-				out = out.replace(s, fn)
+		if not fmt:
+			done(res, out)
+			return
+
+		def f():
+			try:
+				s = fmt(out, err)
+			except Exception:
+				gs.error_traceback(dmn)
+				s = out
+			done(res, s)
+
+		if filter:
+			# after the streamed output that's still being filtered
+			gsq.dispatch(STREAM_DOMAIN, f)
+		else:
+			# fmt may run other commands, keep it off MarGo's thread
+			gsq.launch(dmn, f)
 
+	def done(res, out):
 		def f():
-			gs.end(tid)
+			if st.flush():
+				# the rest of the output goes in before the command is marked done
+				sublime.set_timeout(f, STREAM_INTERVAL_MS)
+				return
+			gs.end(job.tid)
 			push_output(view, rkey, out, hourglass_repl='| done: %s' % res.get('dur', ''))
 
 		sublime.set_timeout(f, 0)
 
-	return cid, cb
+	def cancelled():
+		push_output(view, rkey, '', hourglass_repl='| cancelled')
+
+	scheduler.submit(job, lambda: sublime.set_timeout(start, 0), cancelled)
 
 def cmd_margo_reinstall(view, edit, args, wd, rkey):
 	def cb():
@@ -621,17 +855,14 @@ def cmd_clear(view, edit, args, wd, rkey):
 def cmd_go(view, edit, args, wd, rkey):
 	_save_all(view.window(), wd)
 
-	cid, cb = _9_begin_call('go', view, edit, args, wd, rkey, '9go-%s' % wd)
-	a = {
-		'cid': cid,
+	_9_call('go', view, edit, args, wd, rkey, '9go-%s' % wd, 'sh', {
 		'env': sh.env(),
 		'cwd': wd,
 		'cmd': {
 			'name': 'go',
 			'args': args,
 		}
-	}
-	sublime.set_timeout(lambda: mg9.acall('sh', a, cb), 0)
+	})
 
 def cmd_cancel_replay(view, edit, args, wd, rkey):
 	cid = ''
@@ -650,17 +881,14 @@ def cmd_cancel_replay(view, edit, args, wd, rkey):
 	push_output(view, rkey, '')
 
 def cmd_sh(view, edit, args, wd, rkey):
-	cid, cb = _9_begin_call('sh', view, edit, args, wd, rkey, '')
-	a = {
-		'cid': cid,
+	_9_call('sh', view, edit, args, wd, rkey, '', 'sh', {
 		'env': sh.env(),
 		'cwd': wd,
 		'cmd': {
 			'name': args[0],
 			'args': args[1:],
 		}
-	}
-	sublime.set_timeout(lambda: mg9.acall('sh', a, cb), 0)
+	})
 
 def cmd_share(view, edit, args, wd, rkey):
 	av = gs.active_valid_go_view(win=view.window())
@@ -696,10 +924,8 @@ def cmd_9(view, edit, args, wd, rkey):
 	cid = ''
 	if subcmd == 'replay':
 		cid = '9replay-%s' % wd
-	cid, cb = _9_begin_call(subcmd, view, edit, args, wd, rkey, cid)
 
 	a = {
-		'cid': cid,
 		'env': sh.env(),
 		'dir': wd,
 		'args': args[1:],
@@ -718,7 +944,7 @@ def cmd_9(view, edit, args, wd, rkey):
 					a['fn'] = gs.view_fn(av)
 					a['src'] = av.substr(sublime.Region(0, av.size()))
 
-	sublime.set_timeout(lambda: mg9.acall('play', a, cb), 0)
+	_9_call(subcmd, view, edit, args, wd, rkey, cid, 'play', a)
 
 def cmd_tskill(view, edit, args, wd, rkey):
 	if len(args) == 0:
@@ -729,11 +955,226 @@ def cmd_tskill(view, edit, args, wd, rkey):
 	l = []
 	for tid in args:
 		tid = tid.lstrip('#')
+		if tid.isdigit():
+			# a job id, the job is dropped if it hasn't started yet
+			job = scheduler.get(int(tid))
+			ok = job is not None and (scheduler.cancel(job) or (job.state == 'running' and gs.cancel_task(job.tid)))
+			l.append('kill #%s: %s' % (tid, ('yes' if ok else 'no')))
+			continue
+
 		tid = tid_alias.get('%s-%s' % (tid, wd), tid)
 		l.append('kill %s: %s' % (tid, ('yes' if gs.cancel_task(tid) else 'no')))
 
 	push_output(view, rkey, '\n'.join(l))
 
+def _job_list(args):
+	# the jobs listed in args, as `#ID` or `ID`
+	l = []
+	for s in args:
+		try:
+			j = scheduler.get(int(s.lstrip('#')))
+		except ValueError:
+			j = None
+		if j is None:
+			return [], 'invalid job id: `%s`' % s
+		l.append(j)
+	return l, ''
+
+def cmd_jobs(view, edit, args, wd, rkey):
+	l = scheduler.list(wd)
+	push_output(view, rkey, '\n'.join(j.summary() for j in l) or 'no jobs')
+
+def _wait(view, rkey, l):
+	start = time.time()
+	def f():
+		push_output(view, rkey, '\n'.join(j.summary() for j in l), hourglass_repl='| done: %0.3fs' % (time.time() - start))
+
+	scheduler.wait(l, f)
+
+def cmd_wait(view, edit, args, wd, rkey):
+	if args:
+		l, err = _job_list(args)
+		if err:
+			push_output(view, rkey, err)
+			return
+	else:
+		l = [j for j in scheduler.list(wd) if j.state != 'done']
+
+	_wait(view, rkey, l)
+
+def cmd_fg(view, edit, args, wd, rkey):
+	if args:
+		l, err = _job_list(args[:1])
+		if err:
+			push_output(view, rkey, err)
+			return
+	else:
+		l = [j for j in scheduler.list(wd) if j.background and j.state != 'done'][-1:]
+		if not l:
+			push_output(view, rkey, 'no background jobs')
+			return
+
+	scheduler.fg(l[0])
+	_wait(view, rkey, l)
+
+def cmd_bench(view, edit, args, wd, rkey):
+	usage = 'usage: bench [-n COUNT] [-base REV] [-run REGEXP] [-l] [PKG]'
+	count = 5
+	base = ''
+	pat = '.'
+	pkg = '.'
+	ls = False
+	try:
+		l = list(args)
+		while l:
+			s = l.pop(0)
+			if s == '-n':
+				count = int(l.pop(0))
+			elif s == '-base':
+				base = l.pop(0)
+			elif s == '-run':
+				pat = l.pop(0)
+			elif s == '-l':
+				ls = True
+			elif s.startswith('-') or l:
+				raise ValueError(s)
+			else:
+				pkg = s
+	except (IndexError, ValueError):
+		push_output(view, rkey, usage)
+		return
+
+	# runs are stored by package, relative packages are keyed by their directory
+	pkg_dir = wd
+	if pkg.startswith('.'):
+		pkg_dir = pkg = os.path.normpath(os.path.join(wd, pkg))
+
+	if ls:
+		push_output(view, rkey, '\n'.join(bench.revs(pkg)) or 'no runs for `%s`' % pkg)
+		return
+
+	if base and bench.load(pkg, base) is None:
+		push_output(view, rkey, 'no runs for `%s` at `%s`' % (pkg, base))
+		return
+
+	def fmt(out, err):
+		results = bench.parse(out)
+		if err or not results:
+			return out
+
+		# fmt runs on a worker, so git doesn't hold up the UI
+		rev = bench.git_rev(pkg_dir) or 'norev'
+		bench.save(pkg, rev, results)
+		b = base or next((r for r in bench.revs(pkg) if r != rev), '')
+		old = bench.load(pkg, b) if b else None
+		if old:
+			s = '%s: %s vs. %s' % (pkg, b, rev)
+		else:
+			s = '%s: %s' % (pkg, rev)
+		return '%s\n\n%s' % (s, bench.compare(old, results))
+
+	_save_all(view.window(), wd)
+	_9_call('bench', view, edit, args, wd, rkey, '', 'sh', {
+		'env': sh.env(),
+		'cwd': wd,
+		'cmd': {
+			'name': 'go',
+			'args': ['test', '-run=^$', '-bench=%s' % pat, '-benchmem', '-count=%d' % count, pkg],
+		}
+	}, fmt=fmt)
+
+def cmd_pprof(view, edit, args, wd, rkey):
+	usage = 'usage: pprof [-n COUNT] [-run REGEXP] [-bench REGEXP] [-list REGEXP] [PKG]'
+	n = 10
+	run = ''
+	pat = ''
+	lst = ''
+	pkg = '.'
+	try:
+		l = list(args)
+		while l:
+			s = l.pop(0)
+			if s == '-n':
+				n = int(l.pop(0))
+			elif s == '-run':
+				run = l.pop(0)
+			elif s == '-bench':
+				pat = l.pop(0)
+			elif s == '-list':
+				lst = l.pop(0)
+			elif s.startswith('-') or l:
+				raise ValueError(s)
+			else:
+				pkg = s
+	except (IndexError, ValueError):
+		push_output(view, rkey, usage)
+		return
+
+	if pat and not run:
+		run = '^$'
+
+	bin_fn, cpu_fn, mem_fn = pprof.files(os.path.normpath(os.path.join(wd, pkg)))
+	a = ['test', '-cpuprofile', cpu_fn, '-memprofile', mem_fn, '-o', bin_fn]
+	if run:
+		a.append('-run=%s' % run)
+	if pat:
+		a.append('-bench=%s' % pat)
+	a.append(pkg)
+
+	def fmt(out, err):
+		if err:
+			return out
+
+		l = [out.strip()]
+		for nm, fn in (('cpu', cpu_fn), ('memory', mem_fn)):
+			l.append('%s profile: %s\n%s' % (nm, fn, pprof.top(bin_fn, fn, n)))
+			if lst:
+				l.append(pprof.listing(bin_fn, fn, lst))
+		return '\n\n'.join(s for s in l if s)
+
+	_save_all(view.window(), wd)
+	_9_call('pprof', view, edit, args, wd, rkey, '', 'sh', {
+		'env': sh.env(),
+		'cwd': wd,
+		'cmd': {
+			'name': 'go',
+			'args': a,
+		}
+	}, fmt=fmt)
+
+def cmd_test(view, edit, args, wd, rkey):
+	p = testcache.Parser()
+	# a filtered run doesn't say whether the whole package passes
+	partial = any(TEST_FILTER_PAT.match(s) for s in args)
+
+	def fmt(out, err):
+		out = '%s%s' % (p.flush(), out)
+		res = testcache.record(p.events, start, partial)
+		if not res:
+			return out
+		return '%s\n%s' % (out.strip(), testcache.summary(res))
+
+	_save_all(view.window(), wd)
+	# files saved above are covered by the run
+	start = time.time()
+	_9_call('test', view, edit, args, wd, rkey, '9go-%s' % wd, 'sh', {
+		'env': sh.env(),
+		'cwd': wd,
+		'cmd': {
+			'name': 'go',
+			'args': gs.lst('test', '-json', args),
+		}
+	}, fmt=fmt, filter=p.feed)
+
+def cmd_shbench(view, edit, args, wd, rkey):
+	try:
+		n = int(args[0]) if args else 20
+	except ValueError:
+		push_output(view, rkey, 'usage: shbench [N]')
+		return
+
+	gsq.launch(DOMAIN, lambda: push_output(view, rkey, sh.bench_coproc(n)))
+
 def _env_settings(d, view, edit, args, wd, rkey):
 	if len(args) > 0:
 		m = {}
@@ -756,20 +1197,17 @@ def cmd_env(view, edit, args, wd, rkey):
 	_env_settings(sh.env(), view, edit, args, wd, rkey)
 
 def cmd_hist(view, edit, args, wd, rkey):
-	aso = gs.aso()
-	hkey = _hkey(wd)
+	h = hist.get(_hkey(wd))
 
 	s = 'hist: invalid args: %s' % args
 
 	if len(args) == 0:
-		hist = gs.dval(aso.get(hkey), [])
-		hist.reverse()
-		hlen = len(hist)
-		s = '\n'.join('^%d: %s' % (i+1, v) for i,v in enumerate(hist))
+		l = h.all()
+		l.reverse()
+		s = '\n'.join('^%d: %s' % (i+1, v) for i,v in enumerate(l))
 	elif len(args) == 1:
 		if args[0] == 'erase':
-			aso.erase(hkey)
-			gs.save_aso()
+			h.erase()
 			s = ''
 
 	push_output(view, rkey, s)
@@ -1,12 +1,16 @@
+from gosubl import ev
 from gosubl import gs
 from gosubl import mg9
 from os.path import basename
 from os.path import dirname
+import hashlib
 import json
 import os
 import re
 import sublime
 import sublime_plugin
+import threading
+import time
 
 AC_OPTS = sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_EXPLICIT_COMPLETIONS
 REASONABLE_PKGNAME_PAT = re.compile(r'^\w+$')
@@ -16,72 +20,434 @@ END_SELECTOR_PAT = re.compile(r'.*?((?:[\w.]+\.)?(\w+))$')
 START_SELECTOR_PAT = re.compile(r'^([\w.]+)')
 DOMAIN = 'GsComplete'
 SNIPPET_VAR_PAT = re.compile(r'\$\{([a-zA-Z]\w*)\}')
+TYPE_DECL_PAT = re.compile(r'\btype[ \t]+(\w+)')
+TYPE_DECL_SELECTOR = 'source.go keyword.'
+
+# edits made by these commands stay within the rows of the selection and the cursor
+LOCAL_EDIT_COMMANDS = set([
+	'insert',
+	'left_delete',
+	'right_delete',
+	'delete_word',
+	'insert_snippet',
+	'commit_completion',
+	'insert_best_completion',
+	'insert_completion',
+])
+
+# a completion request that wasn't answered within this many seconds is sent again
+COMP_PENDING_TIMEOUT = 10
+CALLTIP_DELAY = 250
+CALLTIP_SCAN_LIMIT = 4096
+CALLTIP_SKIP_SELECTOR = 'comment, string, constant.other.rune'
+BLOCK_START_PAT = re.compile(r'\s*(?:\}\s*)?(?:if|for|switch|select|else|func|go|defer)\b')
 
 HINT_KEY = '%s.completion-hint' % DOMAIN
 
-def snippet_match(ctx, m):
-	try:
-		for k,p in m.get('match', {}).items():
-			q = ctx.get(k, '')
+_snippet_engine = None
+
+SNIPPET_TYPE_VARS = frozenset(('typename', 'typename_abbr'))
+SNIPPET_MEMO_SIZE = 64
+
+class SnippetTemplate(object):
+	def __init__(self, s):
+		# `a ${b} c` is split into ['a ', 'b', ' c'], odd indices are var names
+		self.parts = SNIPPET_VAR_PAT.split(s)
+		self.vars = frozenset(self.parts[1::2])
+
+	def expand(self, vars):
+		l = self.parts[:]
+		for i in range(1, len(l), 2):
+			l[i] = vars.get(l[i], '')
+		return ''.join(l)
+
+class SnippetMatcher(object):
+	def __init__(self, m):
+		self.conds = []
+		for k, p in m.get('match', {}).items():
 			if p and gs.is_a_string(p):
-				if not re.search(p, str(q)):
+				try:
+					self.conds.append((k, True, re.compile(p)))
+				except Exception:
+					gs.notice(DOMAIN, gs.traceback())
+			else:
+				self.conds.append((k, False, p))
+
+		self.snippets = []
+		self.vars = set()
+		for ent in m.get('snippets', []):
+			text = ent.get('text', '')
+			title = ent.get('title', '')
+			value = ent.get('value', '')
+			if text and value:
+				tpls = (SnippetTemplate(text), SnippetTemplate(title), SnippetTemplate(value))
+				per_type = False
+				for t in tpls:
+					self.vars.update(t.vars)
+					per_type = per_type or bool(t.vars & SNIPPET_TYPE_VARS)
+				self.snippets.append((tpls, per_type))
+
+		self.keys = set(k for k, _, _ in self.conds)
+
+	def match(self, ctx):
+		try:
+			for k, is_pat, p in self.conds:
+				q = ctx.get(k, '')
+				if is_pat:
+					if not p.search(str(q)):
+						return False
+				elif p != q:
 					return False
-			elif p != q:
-				return False
+		except:
+			gs.notice(DOMAIN, gs.traceback())
+		return True
+
+class SnippetEngine(object):
+	"""
+	The `default_snippets` and `snippets` settings compiled into matchers with their
+	regexps and templates prepared. Results are memoized per context signature: the values
+	of the context keys that any matcher or template depends on, plus the type names.
+	"""
+
+	def __init__(self, defs):
+		self.defs = defs
+		self.matchers = []
+		for l in defs:
+			for m in l:
+				try:
+					self.matchers.append(SnippetMatcher(m))
+				except:
+					gs.notice(DOMAIN, gs.traceback())
+
+		keys = set()
+		for mt in self.matchers:
+			keys.update(mt.keys)
+			keys.update(mt.vars)
+		keys.difference_update(SNIPPET_TYPE_VARS)
+		keys.discard('types')
+		self.keys = sorted(keys)
+		self.lck = threading.Lock()
+		self.memo = {}
+
+	def signature(self, ctx, types):
+		sig = []
+		for k in self.keys:
+			v = ctx.get(k)
+			if gs.is_a(v, []):
+				v = tuple(v)
+			sig.append(v)
+		return (tuple(sig), types)
+
+	def resolve(self, ctx):
+		types = ('',) if ctx.get('local') else tuple(ctx.get('types') or ())
+		sig = self.signature(ctx, types)
+		with self.lck:
+			cl = self.memo.get(sig)
+
+		if cl is None:
+			cl = self.expand(ctx, types)
+			with self.lck:
+				if len(self.memo) >= SNIPPET_MEMO_SIZE:
+					self.memo.clear()
+				self.memo[sig] = cl
+
+		return cl[:]
+
+	def expand(self, ctx, types):
+		cl = set()
+		vars = {}
+		for k,v in ctx.items():
+			if gs.is_a_string(v):
+				vars[k] = v
+
+		for mt in self.matchers:
+			if not mt.match(ctx):
+				continue
+
+			for tpls, per_type in mt.snippets:
+				text, title, value = tpls
+				# templates that don't refer to the type name expand the same for every type
+				for typename in (types if per_type else types[:1]):
+					vars['typename'] = typename
+					vars['typename_abbr'] = typename_abbr(typename)
+					s = u'%s\t%s \u0282' % (text.expand(vars), title.expand(vars))
+					cl.add((s, value.expand(vars)))
+
+		return list(cl)
+
+def typename_abbr(typename):
+	if not typename:
+		return ''
+
+	if len(typename) > 1 and typename[0].islower() and typename[1].isupper():
+		return typename[1].lower()
+
+	return typename[0].lower()
+
+def compile_snippets():
+	# snippets are compiled when the settings change, not when they're resolved
+	global _snippet_engine
+
+	m = gs.settings_dict()
+	defs = (m.get('default_snippets') or [], m.get('snippets') or [])
+	se = _snippet_engine
+	if se is None or se.defs != defs:
+		se = SnippetEngine(defs)
+		_snippet_engine = se
+	return se
+
+def snippet_engine():
+	se = _snippet_engine
+	if se is None:
+		# the settings were loaded before this module
+		se = compile_snippets()
+	return se
+
+def resolve_snippets(ctx):
+	try:
+		return snippet_engine().resolve(ctx)
 	except:
 		gs.notice(DOMAIN, gs.traceback())
+	return []
+
+def src_hash(*a):
+	h = hashlib.sha1()
+	for s in a:
+		h.update(s.encode('utf-8') if gs.PY3K else gs.astr(s))
+		h.update(b'\0')
+	return h.hexdigest()
+
+def prefix_match(prefix, name):
+	# same (case-insensitive, in-order) matching as the completion popup
+	# so the filtered list is always a superset of what would be shown
+	name = name.lower()
+	i = 0
+	for c in prefix.lower():
+		i = name.find(c, i) + 1
+		if i == 0:
+			return False
 	return True
 
-def expand_snippet_vars(vars, text, title, value):
-	sub = lambda m: vars.get(m.group(1), '')
-	return (
-		SNIPPET_VAR_PAT.sub(sub, text),
-		SNIPPET_VAR_PAT.sub(sub, title),
-		SNIPPET_VAR_PAT.sub(sub, value)
-	)
+def filter_candidates(ents, prefix):
+	if prefix:
+		return [e for e in ents if prefix_match(prefix, e['name'])]
+	return ents
+
+def cache_get(vid, key):
+	with cache_lck:
+		ent = comp_cache.get(vid)
+	if ent and ent[0] == key:
+		return ent[1]
+	return None
+
+def cache_put(vid, key, ents):
+	with cache_lck:
+		comp_cache[vid] = (key, ents)
+
+def cache_del(vid):
+	with cache_lck:
+		comp_cache.pop(vid, None)
+		comp_pending.pop(vid, None)
+
+def cache_pend(vid, key):
+	now = time.time()
+	with cache_lck:
+		ent = comp_pending.get(vid)
+		if ent and ent[0] == key and now - ent[1] < COMP_PENDING_TIMEOUT:
+			return False
+		comp_pending[vid] = (key, now)
+		return True
+
+def cache_unpend(vid, key):
+	with cache_lck:
+		ent = comp_pending.get(vid)
+		if ent and ent[0] == key:
+			del comp_pending[vid]
+
+class TypeIndex(object):
+	"""
+	The names declared by `type X` in a buffer, kept per line so that edits only cause
+	the lines they touched to be re-scanned. A row holding `None` needs to be scanned.
+	"""
+
+	def __init__(self):
+		self.lck = threading.Lock()
+		self.rows = None
+		self.pending = None
+		self.listener = None
+		self.change_count = -1
+		self.names = []
+
+	def listen(self, view):
+		# on ST4, edits are reported by a TextChangeListener attached to the buffer.
+		# on ST3, or if it can't be attached, they're worked out from the commands that made them
+		if not hasattr(sublime_plugin, 'TextChangeListener'):
+			return
 
-def resolve_snippets(ctx):
-	cl = set()
-	types = [''] if ctx.get('local') else ctx.get('types')
-	vars = {}
-	for k,v in ctx.items():
-		if gs.is_a_string(v):
-			vars[k] = v
+		try:
+			l = GsTypeIndexListener()
+			l.attach(view.buffer())
+			self.listener = l
+		except Exception:
+			self.listener = None
 
-	try:
-		snips = []
-		snips.extend(gs.setting('default_snippets', []))
-		snips.extend(gs.setting('snippets', []))
-		for m in snips:
+	def unlisten(self):
+		l, self.listener = self.listener, None
+		if l is not None:
 			try:
-				if snippet_match(ctx, m):
-					for ent in m.get('snippets', []):
-						text = ent.get('text', '')
-						title = ent.get('title', '')
-						value = ent.get('value', '')
-						if text and value:
-							for typename in types:
-								vars['typename'] = typename
-								if typename:
-									if len(typename) > 1 and typename[0].islower() and typename[1].isupper():
-										vars['typename_abbr'] = typename[1].lower()
-									else:
-										vars['typename_abbr'] = typename[0].lower()
-								else:
-									vars['typename_abbr'] = ''
-
-								txt, ttl, val = expand_snippet_vars(vars, text, title, value)
-								s = u'%s\t%s \u0282' % (txt, ttl)
-								cl.add((s, val))
-			except:
-				gs.notice(DOMAIN, gs.traceback())
-	except:
-		gs.notice(DOMAIN, gs.traceback())
-	return list(cl)
+				l.detach()
+			except Exception:
+				pass
+
+	def reset(self):
+		with self.lck:
+			self.rows = None
+
+	def before(self, view, cmd):
+		# ST3 has no TextChangeListener. edits made by local commands stay within the rows
+		# of the selection they're made at, so note those rows for the modification that follows
+		with self.lck:
+			self.pending = None
+			if self.rows is None or cmd not in LOCAL_EDIT_COMMANDS:
+				return
+			sel = [(view.rowcol(r.begin())[0], view.rowcol(r.end())[0], r.empty()) for r in view.sel()]
+			self.pending = (view.change_count(), sel)
+
+	def after(self):
+		# the command is over. if it didn't change anything, the next modification isn't its own
+		with self.lck:
+			self.pending = None
+
+	def touch(self, view):
+		with self.lck:
+			pending, self.pending = self.pending, None
+			if self.rows is None:
+				return
+
+			# anything that isn't the modification of a single local command can't be localized
+			if pending is None or view.change_count() != pending[0] + 1:
+				self.rows = None
+				return
+
+			cc, sel = pending
+			delta = view.rowcol(view.size())[0] + 1 - len(self.rows)
+			if len(sel) != 1:
+				# with several cursors the rows added or removed can't be attributed to each of them
+				if delta != 0 or len(view.sel()) != len(sel) or not all(empty for _, _, empty in sel):
+					self.rows = None
+					return
+				for row_a, row_b, _ in sel:
+					self.rows[row_a:row_b+1] = [None] * (row_b - row_a + 1)
+				return
+
+			# old rows [row_a, row_b] became the rows [row_a, row_b+delta]. the cursor may have ended up
+			# outside of them e.g. after a delete at the start or end of a row, which joins it with its neighbour
+			sel_a, sel_b = sel[0][:2]
+			r = view.sel()[0]
+			cur_a = view.rowcol(r.begin())[0]
+			cur_b = view.rowcol(r.end())[0]
+			row_a = min(sel_a, cur_a)
+			row_b = max(sel_b, cur_b - delta)
+			if row_a < 0 or row_b >= len(self.rows) or row_b + delta < row_a:
+				self.rows = None
+				return
+			self.rows[row_a:row_b+1] = [None] * (row_b + delta - row_a + 1)
+
+	def edit(self, row_a, row_b, text):
+		# rows `row_a` to `row_b` were replaced by `text`
+		with self.lck:
+			if self.rows is not None:
+				self.rows[row_a:row_b+1] = [None] * (text.count('\n') + 1)
+
+	def types(self, view):
+		with self.lck:
+			cc = view.change_count()
+			if cc == self.change_count:
+				return self.names
+
+			nrows = view.rowcol(view.size())[0] + 1
+			if self.rows is None or len(self.rows) != nrows:
+				lines = view.substr(sublime.Region(0, view.size())).split('\n')
+				self.rows = [self.scan(view, row, ln) for row, ln in enumerate(lines)]
+			else:
+				for row, names in enumerate(self.rows):
+					if names is None:
+						ln = view.substr(view.line(view.text_point(row, 0)))
+						self.rows[row] = self.scan(view, row, ln)
+
+			self.names = [nm for names in self.rows for nm in names]
+			self.change_count = cc
+			return self.names
+
+	def scan(self, view, row, ln):
+		if 'type' not in ln:
+			return ()
+
+		names = []
+		for m in TYPE_DECL_PAT.finditer(ln):
+			if view.match_selector(view.text_point(row, m.start()), TYPE_DECL_SELECTOR):
+				names.append(m.group(1))
+		return tuple(names)
+
+def type_index(view):
+	with cache_lck:
+		ti = type_indexes.get(view.buffer_id())
+		if ti is None:
+			ti = TypeIndex()
+			ti.listen(view)
+			type_indexes[view.buffer_id()] = ti
+		return ti
+
+def existing_type_index(buffer_id):
+	with cache_lck:
+		return type_indexes.get(buffer_id)
+
+if hasattr(sublime_plugin, 'TextChangeListener'):
+	class GsTypeIndexListener(sublime_plugin.TextChangeListener):
+		# it's attached by TypeIndex.listen() to the buffers that have a type index
+		@classmethod
+		def is_applicable(cls, buffer):
+			return False
+
+		def on_text_changed(self, changes):
+			ti = existing_type_index(self.buffer.id())
+			if ti is not None:
+				for c in changes:
+					ti.edit(c.a.row, c.b.row, c.str)
 
 class GoSublime(sublime_plugin.EventListener):
 	gocode_set = False
+	def on_close(self, view):
+		cache_del(view.id())
+		with cache_lck:
+			ti = type_indexes.pop(view.buffer_id(), None)
+		if ti is not None:
+			ti.unlisten()
+
+	def on_text_command(self, view, name, args):
+		ti = existing_type_index(view.buffer_id())
+		if ti is not None and ti.listener is None:
+			ti.before(view, name)
+
+	def on_post_text_command(self, view, name, args):
+		ti = existing_type_index(view.buffer_id())
+		if ti is not None and ti.listener is None:
+			ti.after()
+
+	def on_modified(self, view):
+		# without a TextChangeListener, the changed rows are worked out from the command that made the change
+		ti = existing_type_index(view.buffer_id())
+		if ti is not None and ti.listener is None:
+			ti.touch(view)
+
 	def on_query_completions(self, view, prefix, locations):
+		start = time.time()
+		try:
+			return self.query_completions(view, prefix, locations)
+		finally:
+			ev.debug(DOMAIN, 'on_query_completions: %0.3fms' % ((time.time() - start) * 1000))
+
+	def query_completions(self, view, prefix, locations):
 		pos = locations[0]
 		scopes = view.scope_name(pos).split()
 		if ('source.go' not in scopes) or (gs.setting('gscomplete_enabled', False) is not True):
@@ -90,14 +456,7 @@ class GoSublime(sublime_plugin.EventListener):
 		if gs.IGNORED_SCOPES.intersection(scopes):
 			return ([], AC_OPTS)
 
-		types = []
-		for r in view.find_by_selector('source.go keyword.'):
-			if view.substr(r) == 'type':
-				end = r.end()
-				r = view.find(r'\s+(\w+)', end)
-				if r.begin() == end:
-					types.append(view.substr(r).lstrip())
-
+		types = type_index(view).types(view)
 
 		try:
 			if basename(view.file_name()) == "main.go":
@@ -139,29 +498,81 @@ class GoSublime(sublime_plugin.EventListener):
 			return ([], AC_OPTS)
 
 		nc = view.substr(sublime.Region(pos, pos+1))
-		cl = self.complete(fn, offset, src, nc.isalpha() or nc == "(")
+		func_name_only = nc.isalpha() or nc == "("
 
+		snips = []
 		pc = view.substr(sublime.Region(pos-1, pos))
 		if show_snippets and (pc.isspace() or pc.isalpha()):
 			if scopes[-1] == 'source.go':
-				cl.extend(resolve_snippets(ctx))
+				snips = resolve_snippets(ctx)
 			elif scopes[-1] == 'meta.block.go' and ('meta.function.plain.go' in scopes or 'meta.function.receiver.go' in scopes):
 				ctx['global'] = False
 				ctx['local'] = True
-				cl.extend(resolve_snippets(ctx))
+				snips = resolve_snippets(ctx)
+
+		key = self.cache_key(offset, src, prefix)
+		ents = cache_get(view.id(), key)
+		if ents is None:
+			return self.complete_async(view, fn, offset, src, prefix, key, func_name_only, snips)
+
+		cl = self.complete(filter_candidates(ents, prefix), func_name_only)
+		cl.extend(snips)
 		return (cl, AC_OPTS)
 
 	def find_end_pt(self, view, pat, start, end, flags=sublime.LITERAL):
 		r = view.find(pat, start, flags)
 		return r.end() if r and r.end() < end else -1
 
-	def complete(self, fn, offset, src, func_name_only):
+	def cache_key(self, offset, src, prefix):
+		# gocode is queried at the 'dot' so as long as nothing outside the identifier
+		# being typed changes, the previous result is still valid for the new prefix
+		pos = offset + len(prefix)
+		return (offset, mg9.complete_builtins(), src_hash(src[:offset], src[pos:]))
+
+	def complete_async(self, view, fn, offset, src, prefix, key, func_name_only, snips):
+		# this runs on the UI thread so never wait for MarGo here. return what we have now and
+		# fill in the gocode results when they arrive, either through the completion list (st4)
+		# or by re-opening the completion popup, which will then be served from the cache
+		vid = view.id()
+		cc = view.change_count()
+		clist = sublime.CompletionList() if hasattr(sublime, 'CompletionList') else None
+
+		def f(ents, err):
+			cache_unpend(vid, key)
+			if err:
+				gs.notice(DOMAIN, err)
+			else:
+				cache_put(vid, key, ents)
+
+			def cb():
+				stale = view.change_count() != cc
+				if clist is not None:
+					cl = []
+					if not stale and not err:
+						cl = self.complete(filter_candidates(ents, prefix), func_name_only)
+					cl.extend(snips)
+					clist.set_completions(cl, AC_OPTS)
+				elif not stale and not err:
+					view.run_command('auto_complete', {
+						'disable_auto_insert': True,
+						'api_completions_only': True,
+						'next_completion_if_showing': False,
+					})
+
+			sublime.set_timeout(cb, 0)
+
+		if clist is not None:
+			mg9.acomplete(fn, src, offset, f)
+			return clist
+
+		if cache_pend(vid, key):
+			mg9.acomplete(fn, src, offset, f)
+		return (snips, AC_OPTS)
+
+	def complete(self, ents, func_name_only):
 		comps = []
 		autocomplete_tests = gs.setting('autocomplete_tests', False)
 		autocomplete_closures = gs.setting('autocomplete_closures', False)
-		ents, err = mg9.complete(fn, src, offset)
-		if err:
-			gs.notice(DOMAIN, err)
 
 		name_fx = None
 		name_fx_pat = gs.setting('autocomplete_filter_name')
@@ -266,17 +677,157 @@ def declex(s):
 		ret = s[ep:].strip() if ep < lp else ''
 	return (params, ret)
 
-def _ct_poller():
-	try:
-		view = sublime.active_window().active_view()
-		if gs.setting('calltips') is True:
-			view.run_command('gs_show_call_tip', {'set_status': True})
-		else:
-			view.erase_status(HINT_KEY)
-	except Exception:
-		pass
+def call_start(view, pos):
+	# the position of the `(` of the call expression that encloses `pos` or -1.
+	# balanced brackets, strings and comments are skipped, the scan stops at the start of a block
+	start = max(0, pos - CALLTIP_SCAN_LIMIT)
+	l = list(view.substr(sublime.Region(start, pos)))
+	for r in view.find_by_selector(CALLTIP_SKIP_SELECTOR):
+		a = max(r.begin(), start)
+		b = min(r.end(), pos)
+		if a < b:
+			l[a-start:b-start] = ' ' * (b - a)
+	s = ''.join(l)
+
+	closers = []
+	for i in range(len(s)-1, -1, -1):
+		c = s[i]
+		if c in ')]}':
+			closers.append(c)
+		elif c in '([{':
+			if closers:
+				closers.pop()
+			elif c == '(':
+				return start + i
+			elif c == '{' and is_block_start(s, i):
+				return -1
+	return -1
+
+def is_block_start(s, i):
+	# whether the `{` at s[i] opens a block rather than a composite literal like `T{`
+	j = i - 1
+	while j >= 0 and s[j].isspace():
+		j -= 1
+	if j >= 0 and s[j] == ')':
+		return True
+	return BLOCK_START_PAT.match(s, s.rfind('\n', 0, i) + 1) is not None
+
+def calltip_status(c):
+	if not c:
+		return ''
+
+	pfx = 'func('
+	typ = c['type']
+	if typ.startswith(pfx):
+		return 'func %s(%s' % (c['name'], typ[len(pfx):])
+	return '%s: %s' % (c['name'], typ)
+
+def set_calltip_status(view, s):
+	if s:
+		view.set_status(HINT_KEY, s)
+	else:
+		view.erase_status(HINT_KEY)
+
+def calltip_sched(view):
+	vid = view.id()
+	with cache_lck:
+		gen = calltip_gens.get(vid, 0) + 1
+		calltip_gens[vid] = gen
+
+	sublime.set_timeout(lambda: calltip_update(view, gen), CALLTIP_DELAY)
+
+def calltip_update(view, gen):
+	# only the last of a burst of events makes it past this point
+	vid = view.id()
+	with cache_lck:
+		if calltip_gens.get(vid) != gen:
+			return
+
+	if gs.setting('calltips') is not True:
+		view.erase_status(HINT_KEY)
+		return
+
+	win = view.window()
+	if win is None or win.active_view() is None or win.active_view().id() != vid:
+		return
+
+	if not gs.is_go_source_view(view):
+		return
+
+	pos = gs.sel(view).begin()
+	start = call_start(view, pos)
+	if start < 0:
+		view.erase_status(HINT_KEY)
+		return
+
+	# the tip is that of the enclosing call, so moving around inside its argument list
+	# doesn't need a new one until the buffer changes
+	key = (view.change_count(), start)
+	with cache_lck:
+		ent = calltip_cache.get(vid)
+	if ent and ent[0] == key:
+		set_calltip_status(view, ent[1])
+		return
+
+	def f(cl, err):
+		s = calltip_status(cl[0] if len(cl) == 1 else {})
+
+		def cb():
+			with cache_lck:
+				calltip_cache[vid] = (key, s)
+				current = calltip_gens.get(vid) == gen
+
+			if current and view.change_count() == key[0]:
+				set_calltip_status(view, s)
+
+		sublime.set_timeout(cb, 0)
+
+	mg9.calltip(view.file_name(), gs.view_src(view), pos, True, f)
+
+class GsCallTipListener(sublime_plugin.EventListener):
+	def on_selection_modified(self, view):
+		calltip_sched(view)
+
+	def on_modified(self, view):
+		calltip_sched(view)
+
+	def on_activated(self, view):
+		calltip_sched(view)
+
+	def on_close(self, view):
+		with cache_lck:
+			calltip_gens.pop(view.id(), None)
+			calltip_cache.pop(view.id(), None)
+
+def bench_completions(view, n):
+	# the time on_query_completions holds the UI thread for with the blocking MarGo call it used to make,
+	# and with the asynchronous one. the cache is emptied before each run so that MarGo is asked every time
+	if gs.setting('gscomplete_enabled', False) is not True:
+		return 'gscomplete_enabled is not set'
+
+	fn = view.file_name()
+	src = gs.view_src(view)
+	pos = gs.sel(view).begin()
+	gsl = GoSublime()
+	l = []
+	for name, f in (
+		('blocking', lambda: mg9.complete(fn, src, pos)),
+		('async', lambda: gsl.on_query_completions(view, '', [pos])),
+	):
+		start = time.time()
+		for i in range(n):
+			cache_del(view.id())
+			f()
+		dur = time.time() - start
+		l.append('%s: %d runs in %0.3fs, %0.1fms/run' % (name, n, dur, dur * 1000 / n))
+	return '\n'.join(l)
+
+class GsBenchCompletions(sublime_plugin.TextCommand):
+	def is_enabled(self):
+		return gs.is_go_source_view(self.view)
 
-	sublime.set_timeout(_ct_poller, 1000)
+	def run(self, edit, n=10):
+		gs.show_output(DOMAIN, bench_completions(self.view, n))
 
 class GsShowCallTip(sublime_plugin.TextCommand):
 	def is_enabled(self):
@@ -285,32 +836,22 @@ class GsShowCallTip(sublime_plugin.TextCommand):
 	def run(self, edit, set_status=False):
 		view = self.view
 
+		if set_status:
+			calltip_sched(view)
+			return
+
 		def f(cl, err):
 			def f2(cl, err):
 				c = {}
 				if len(cl) == 1:
 					c = cl[0]
 
-				if set_status:
-					if c:
-						pfx = 'func('
-						typ = c['type']
-						if typ.startswith(pfx):
-							s = 'func %s(%s' % (c['name'], typ[len(pfx):])
-						else:
-							s = '%s: %s' % (c['name'], typ)
-
-
-						view.set_status(HINT_KEY, s)
-					else:
-						view.erase_status(HINT_KEY)
+				if c:
+					s = '%s %s\n%s' % (c['name'], c['class'], c['type'])
 				else:
-					if c:
-						s = '%s %s\n%s' % (c['name'], c['class'], c['type'])
-					else:
-						s = '// %s' % (err or 'No calltips found')
+					s = '// %s' % (err or 'No calltips found')
 
-					gs.show_output(HINT_KEY, s, print_output=False, syntax_file='GsDoc')
+				gs.show_output(HINT_KEY, s, print_output=False, syntax_file='GsDoc')
 
 			sublime.set_timeout(lambda: f2(cl, err), 0)
 
@@ -320,5 +861,36 @@ class GsShowCallTip(sublime_plugin.TextCommand):
 		mg9.calltip(fn, src, pos, set_status, f)
 
 
-if not gs.checked(DOMAIN, '_ct_poller'):
-	_ct_poller()
+try:
+	comp_cache
+except Exception:
+	cache_lck = threading.Lock()
+	comp_cache = {}
+
+# each global needs its own guard: on reload, older ones already exist and newer ones don't
+try:
+	comp_pending
+except NameError:
+	comp_pending = {}
+
+try:
+	type_indexes
+except NameError:
+	type_indexes = {}
+
+try:
+	calltip_gens
+except NameError:
+	calltip_gens = {}
+
+try:
+	calltip_cache
+except NameError:
+	calltip_cache = {}
+
+try:
+	snippets_hooked
+except NameError:
+	snippets_hooked = True
+	# registered once, compile_snippets is looked up when it's called so reloads use the new one
+	ev.settings += lambda: compile_snippets()
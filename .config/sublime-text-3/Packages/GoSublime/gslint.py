@@ -2,6 +2,7 @@ from gosubl import gs
 from gosubl import gsq
 from gosubl import gsshell
 from gosubl import mg9
+import hashlib
 import os
 import re
 import sublime
@@ -15,7 +16,9 @@ CL_DOMAIN = 'GsCompLint'
 class FileRef(object):
 	def __init__(self, view):
 		self.view = view
-		self.src = ''
+		self.fn = view.file_name()
+		self.change_count = -1
+		self.hash = ''
 		self.tm = 0.0
 		self.state = 0
 		self.reports = {}
@@ -31,33 +34,36 @@ class GsLintThread(threading.Thread):
 		threading.Thread.__init__(self)
 		self.daemon = True
 		self.sem = threading.Semaphore()
-		self.s = set()
+		self.s = {}
 		self.q = gs.queue.Queue()
 
-	def putq(self, fn):
+	def putq(self, vid, fn, src):
+		# the src is only held until the view is linted, if the view is
+		# queued again before then, the latest src replaces the old one
 		with self.sem:
-			if fn in self.s:
+			queued = vid in self.s
+			self.s[vid] = (fn, src)
+			if queued:
 				return False
-			self.s.add(fn)
-			self.q.put(fn)
+			self.q.put(vid)
 			return True
 
 	def popq(self):
-		fn = self.q.get()
+		vid = self.q.get()
 		with self.sem:
-			self.s.discard(fn)
-		return fn
+			fn, src = self.s.pop(vid)
+		return vid, fn, src
 
 	def run(self):
 		while True:
-			fn = self.popq()
-			fr = ref(fn, False)
+			vid, fn, src = self.popq()
+			fr = ref(vid)
 			if fr:
 				reports = {}
 				res, _ = mg9.bcall('lint', {
 					'dir': (os.path.dirname(fn) if fn else ''),
 					'fn': fn,
-					'src': fr.src,
+					'src': src,
 					'filter': gs.setting('lint_filter', []),
 				})
 				res = gs.dval(res, {})
@@ -73,12 +79,11 @@ class GsLintThread(threading.Thread):
 					if row >= 0 and msg:
 						reports[row] = Report(row, col, msg)
 
-				fr = ref(fn, False)
-				if fr:
+				fr = ref(vid)
+				if fr and fr.fn == fn:
 					with sem:
 						fr.state = 1
 						fr.reports = reports
-						file_refs[fn] = fr
 
 def highlight(fr):
 	sel = gs.sel(fr.view).begin()
@@ -137,8 +142,7 @@ def watch():
 	view = gs.active_valid_go_view()
 
 	if view is not None and (view.file_name() and gs.setting('comp_lint_enabled') is True):
-		fn = view.file_name()
-		fr = ref(fn)
+		fr = ref(view.id())
 		with sem:
 			if fr:
 				fr.view = view
@@ -150,30 +154,33 @@ def watch():
 	if gs.setting('gslint_enabled') is not True:
 		if view:
 			with sem:
-				for fn in file_refs:
-					fr = file_refs[fn]
+				for fr in file_refs.values():
 					cleanup(fr.view)
 				file_refs = {}
 		sublime.set_timeout(watch, 2000)
 		return
 
 	if view and not view.is_loading():
-		fn = view.file_name()
-		fr = ref(fn)
+		vid = view.id()
+		fr = ref(vid)
 		with sem:
 			if fr:
-				# always use the active view (e.g in split-panes)
 				fr.view = view
 				highlight(fr)
 			else:
 				fr = FileRef(view)
+				file_refs[vid] = fr
 
-			file_refs[fn] = fr
+			src = None
 			if fr.state == 0:
-				src = view.substr(sublime.Region(0, view.size()))
-				if src != fr.src:
-					fr.src = src
-					fr.tm = time.time()
+				change_count = view.change_count()
+				if change_count != fr.change_count:
+					fr.change_count = change_count
+					src = gs.view_src(view)
+					h = src_hash(src)
+					if h != fr.hash:
+						fr.hash = h
+						fr.tm = time.time()
 
 				if fr.tm > 0.0:
 					timeout = int(gs.setting('gslint_timeout', 500))
@@ -184,27 +191,44 @@ def watch():
 						if not th:
 							th = GsLintThread()
 							th.start()
-						th.putq(fn)
+						if src is None:
+							src = gs.view_src(view)
+						th.putq(vid, fr.fn, src)
 
 	sublime.set_timeout(watch, 500)
 
-def ref(fn, validate=True):
+def src_hash(src):
+	if gs.PY3K:
+		src = src.encode('utf-8')
+	else:
+		src = gs.astr(src)
+	return hashlib.sha1(src).hexdigest()
+
+def ref(vid):
 	with sem:
-		if validate:
-			for fn in list(file_refs.keys()):
-				fr = file_refs[fn]
-				if not fr.view.window() or fn != fr.view.file_name():
-					del file_refs[fn]
-		return file_refs.get(fn)
-
-def delref(fn):
+		return file_refs.get(vid)
+
+def delref(vid):
 	with sem:
-		if fn in file_refs:
-			del file_refs[fn]
+		return file_refs.pop(vid, None)
+
+def rename(view):
+	fr = ref(view.id())
+	if fr and fr.fn != view.file_name():
+		delref(view.id())
+		cleanup(view)
 
+class EV(sublime_plugin.EventListener):
+	def on_close(self, view):
+		delref(view.id())
 
-def do_comp_lint(dirname, fn):
-	fr = ref(fn, False)
+	def on_post_save(self, view):
+		# `save as` doesn't have its own event so catch renames here
+		rename(view)
+
+
+def do_comp_lint(vid, dirname, fn):
+	fr = ref(vid)
 	reports = {}
 	if not fr:
 		return
@@ -263,9 +287,11 @@ class GsCompLintCommand(sublime_plugin.TextCommand):
 		fn = self.view.file_name()
 		fn = os.path.abspath(fn)
 		if fn:
+			vid = self.view.id()
 			dirname = gs.basedir_or_cwd(fn)
-			file_refs[fn] = FileRef(self.view)
-			gsq.dispatch(CL_DOMAIN, lambda: do_comp_lint(dirname, fn), '')
+			with sem:
+				file_refs[vid] = FileRef(self.view)
+			gsq.dispatch(CL_DOMAIN, lambda: do_comp_lint(vid, dirname, fn), '')
 
 try:
 	th
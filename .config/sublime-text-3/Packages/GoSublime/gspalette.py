@@ -83,7 +83,7 @@ class GsPaletteCommand(sublime_plugin.WindowCommand):
 					if k != palette:
 						ttl = '@' + k.title()
 						if k == 'errors':
-							fr = gslint.ref(view.file_name())
+							fr = gslint.ref(view.id())
 							if not fr or len(fr.reports) == 0:
 								continue
 							ttl = '%s (%d)' % (ttl, len(fr.reports))
@@ -151,7 +151,7 @@ class GsPaletteCommand(sublime_plugin.WindowCommand):
 	def palette_errors(self, view, direct=False):
 		indent = '' if direct else '    '
 		reps = {}
-		fr = gslint.ref(view.file_name())
+		fr = gslint.ref(view.id())
 		if fr:
 			reps = fr.reports.copy()
 		keys = sorted(reps.keys())
@@ -1,5 +1,7 @@
 from gosubl import gs
+from gosubl import gsq
 from gosubl import mg9
+from gosubl import testcache
 import os
 import re
 import sublime
@@ -33,6 +35,11 @@ class GsTestCommand(sublime_plugin.WindowCommand):
 
 			names = sorted(args.keys())
 			ents = ['Run all tests and examples']
+			modes = {}
+			if pkg_dir:
+				for s, mode in MODES:
+					ents.append(s)
+					modes[s] = mode
 			for k in ['Test', 'Benchmark', 'Example']:
 				if mats.get(k):
 					s = 'Run %ss Only' % k
@@ -50,9 +57,23 @@ class GsTestCommand(sublime_plugin.WindowCommand):
 					args[k] = ['-test.run="^%s$"' % k]
 
 			def cb(i, win):
-				if i >= 0:
+				if i < 0:
+					return
+
+				mode = modes.get(ents[i])
+				if mode is None:
 					a = args.get(ents[i], [])
-					win.active_view().run_command('gs9o_open', {'run': gs.lst('go', 'test', a)})
+					win.active_view().run_command('gs9o_open', {'run': gs.lst('test', a)})
+					return
+
+				def run_mode():
+					a, msg = mode(pkg_dir)
+					if msg:
+						gs.notify(DOMAIN, msg)
+					else:
+						sublime.set_timeout(lambda: win.active_view().run_command('gs9o_open', {'run': gs.lst('test', a)}), 0)
+
+				gsq.launch(DOMAIN, run_mode)
 
 			gs.show_quick_panel(ents, cb)
 
@@ -69,6 +90,50 @@ class GsTestCommand(sublime_plugin.WindowCommand):
 		mg9.declarations(vfn, src, pkg_dir, f)
 
 
+def _list_pkgs(pkg_dir):
+	root = testcache.root(pkg_dir)
+	l, err = testcache.list_pkgs(root)
+	if err:
+		return root, [], 'Cannot list packages: %s' % err
+	return root, l, ''
+
+def affected_args(pkg_dir):
+	# the packages affected by changes since they last passed
+	root, l, err = _list_pkgs(pkg_dir)
+	if err:
+		return [], err
+
+	pkgs = testcache.affected(root, l)
+	if not pkgs:
+		return [], 'No packages are affected by changes since the last green run'
+	return pkgs, ''
+
+def failed_args(pkg_dir):
+	# the tests that failed in their last run
+	root, l, err = _list_pkgs(pkg_dir)
+	if err:
+		return [], err
+
+	m = testcache.failed(testcache.roots(l))
+	if not m:
+		return [], 'No tests failed in their last run'
+
+	names = sorted(set(name for tests in m.values() for name in tests))
+	return gs.lst('-run=^(%s)$' % '|'.join(names), sorted(m.keys())), ''
+
+def slowest_args(pkg_dir):
+	# all packages, so that the slowest start first
+	root, l, err = _list_pkgs(pkg_dir)
+	if err:
+		return [], err
+	return testcache.slowest(testcache.roots(l)), ''
+
+MODES = [
+	('Run affected tests', affected_args),
+	('Run failed tests', failed_args),
+	('Run all tests, slowest packages first', slowest_args),
+]
+
 def match_prefix_name(s):
 	m = TEST_PAT.match(s)
 	return (m.group(2), m.group(1)) if m else ('', '')
@@ -84,9 +149,9 @@ def handle_action(view, action):
 			pat = '^%s$' % name
 
 		if prefix == 'Benchmark':
-			cmd = ['go', 'test', '-test.run=none', '-test.bench="%s"' % pat]
+			cmd = ['test', '-test.run=none', '-test.bench="%s"' % pat]
 		else:
-			cmd = ['go', 'test', '-test.run="%s"' % pat]
+			cmd = ['test', '-test.run="%s"' % pat]
 
 		view.run_command('gs9o_open', {'run': cmd})
 
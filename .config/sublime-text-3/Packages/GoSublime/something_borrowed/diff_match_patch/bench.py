@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+"""Benchmark diff_match_patch under the running Python.
+
+Times diff_main, each cleanup pass, patch_make, patch_apply,
+patch_applyStream and match_main over a corpus of text pairs:
+
+  gofmt      Go files against gofmt-style edits of themselves
+  rewrite    Go files against a large rewrite of themselves
+  repeated   files made of a few lines repeated over and over
+  unicode    text that is mostly outside ASCII
+
+The corpus is generated from a fixed seed, so runs are comparable across
+commits and between python2 and python3.  Diff_Timeout is 0, so
+the work done doesn't depend on the speed of the machine.
+
+Usage: bench.py [-o results.json] [-c baseline.json] [-r repeat] [path ...]
+  -o FILE   write the results to FILE as JSON (default: stdout)
+  -c FILE   compare against the results in FILE
+  -r N      best of N runs (default: 3)
+  path      Go files or directories for the corpus, defaults to the Go
+            sources shipped with GoSublime
+"""
+
+from __future__ import print_function
+
+import getopt
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIR)
+import diff_match_patch as dmp_module
+
+ROOT = os.path.join(DIR, "..", "..")
+
+if sys.version_info[0] < 3:
+  chr = unichr
+  range = xrange
+
+
+def pick(rnd, seq):
+  # random.choice() gives different answers on python2 and python3,
+  # random.random() doesn't.
+  return seq[int(rnd.random() * len(seq))]
+
+
+def go_files(paths):
+  for path in paths:
+    if os.path.isfile(path):
+      yield path
+      continue
+    for (dirpath, dirnames, filenames) in os.walk(path):
+      dirnames.sort()
+      for fn in sorted(filenames):
+        if fn.endswith(".go"):
+          yield os.path.join(dirpath, fn)
+
+
+def read(fn):
+  with open(fn, "rb") as f:
+    return f.read().decode("utf-8")
+
+
+def gofmt_edit(rnd, src):
+  # The kind of changes gofmt makes: indentation, spacing and alignment,
+  # mostly a few characters inside otherwise unchanged lines.
+  lines = src.splitlines(True)
+  for i in range(len(lines)):
+    r = rnd.random()
+    if r < 0.03:
+      lines[i] = "    " + lines[i].lstrip("\t")
+    elif r < 0.06:
+      lines[i] = lines[i].replace(" = ", "  =  ", 1)
+    elif r < 0.08:
+      lines[i] = lines[i].rstrip("\n") + " \n"
+  return "".join(lines)
+
+
+def rewrite_edit(rnd, src):
+  # Blocks of lines moved, dropped, duplicated and changed.
+  lines = src.splitlines(True)
+  for _ in range(max(1, len(lines) // 20)):
+    i = int(rnd.random() * len(lines))
+    j = min(len(lines), i + 1 + int(rnd.random() * 12))
+    r = rnd.random()
+    block = lines[i:j]
+    if r < 0.25:
+      del lines[i:j]
+      k = int(rnd.random() * (len(lines) + 1))
+      lines[k:k] = block
+    elif r < 0.5:
+      del lines[i:j]
+    elif r < 0.75:
+      lines[j:j] = block
+    else:
+      lines[i:j] = [s.replace("err", "e") for s in block]
+    if not lines:
+      lines = ["\n"]
+  return "".join(lines)
+
+
+def repeated_text(rnd, n):
+  lines = ["}\n", "\n", "\treturn nil\n", "\tif err != nil {\n", "\t}\n",
+           "\t\treturn err\n"]
+  return "".join(pick(rnd, lines) for _ in range(n))
+
+
+def unicode_text(rnd, n):
+  alphabets = [
+    [chr(c) for c in range(0x4e00, 0x4e40)],  # CJK
+    [chr(c) for c in range(0x0430, 0x0450)],  # Cyrillic
+    [chr(c) for c in range(0x03b1, 0x03c9)],  # Greek
+    [u" ", u"\n", u"\u3002", u"\xe9", u"\xfc"],
+  ]
+  return u"".join(pick(rnd, pick(rnd, alphabets)) for _ in range(n))
+
+
+def unicode_edit(rnd, text):
+  chars = list(text)
+  for _ in range(len(chars) // 50):
+    i = int(rnd.random() * len(chars))
+    chars[i] = chr(0x4e00 + int(rnd.random() * 0x40))
+  return u"".join(chars)
+
+
+def corpus(paths):
+  rnd = random.Random(39)
+  files = [read(fn) for fn in go_files(paths)]
+  files = [s for s in files if s.strip()]
+  cases = [
+    ("gofmt", [(s, gofmt_edit(rnd, s)) for s in files]),
+    ("rewrite", [(s, rewrite_edit(rnd, s)) for s in files]),
+  ]
+  pairs = []
+  for _ in range(10):
+    text = repeated_text(rnd, 2000)
+    pairs.append((text, rewrite_edit(rnd, text)))
+  cases.append(("repeated", pairs))
+  pairs = []
+  for _ in range(10):
+    text = unicode_text(rnd, 5000)
+    pairs.append((text, unicode_edit(rnd, text)))
+  cases.append(("unicode", pairs))
+  return cases
+
+
+def best(repeat, f):
+  times = []
+  for _ in range(repeat):
+    start = time.time()
+    f()
+    times.append(time.time() - start)
+  return min(times)
+
+
+def bench_case(dmp, pairs, repeat):
+  result = {}
+  diffs = [dmp.diff_main(a, b) for (a, b) in pairs]
+  result["diff_main"] = best(repeat,
+      lambda: [dmp.diff_main(a, b) for (a, b) in pairs])
+  result["diffs"] = sum(len(d) for d in diffs)
+
+  # The cleanups work on the raw diffs, before diff_main merges them.
+  raw = []
+  for (a, b) in pairs:
+    (chars1, chars2, lines) = dmp.diff_linesToChars(a, b)
+    d = dmp.diff_patience(chars1, chars2)
+    dmp.diff_charsToLines(d, lines)
+    raw.append(d)
+  for name in ("diff_cleanupMerge", "diff_cleanupSemantic",
+               "diff_cleanupSemanticLossless", "diff_cleanupEfficiency"):
+    cleanup = getattr(dmp, name)
+    def run():
+      for d in raw:
+        cleanup(list(d))
+    result[name] = best(repeat, run)
+
+  patches = [dmp.patch_make(a, d) for ((a, b), d) in zip(pairs, diffs)]
+  result["patch_make"] = best(repeat,
+      lambda: [dmp.patch_make(a, d) for ((a, b), d) in zip(pairs, diffs)])
+  result["patches"] = sum(len(p) for p in patches)
+  # Apply to the old text with a few characters changed, so that some of the
+  # patches need fuzzy matching.
+  rnd = random.Random(len(pairs))
+  targets = []
+  for (a, b) in pairs:
+    chars = list(a)
+    for _ in range(len(chars) // 200):
+      chars[int(rnd.random() * len(chars))] = u"#"
+    targets.append(u"".join(chars))
+  for name in ("patch_apply", "patch_applyStream"):
+    apply = getattr(dmp, name)
+    result[name] = best(repeat,
+        lambda: [apply(p, t) for (p, t) in zip(patches, targets)])
+  result["applied"] = sum(sum(apply(p, t)[1])
+                          for (p, t) in zip(patches, targets))
+
+  lookups = []
+  for (a, b) in pairs:
+    for _ in range(20):
+      if len(b) <= 40:
+        break
+      i = int(rnd.random() * (len(b) - 32))
+      pattern = list(b[i:i + 32])
+      pattern[int(rnd.random() * 32)] = u"#"
+      lookups.append((a, u"".join(pattern), i + int(rnd.random() * 40) - 20))
+  result["match_main"] = best(repeat,
+      lambda: [dmp.match_main(t, p, loc) for (t, p, loc) in lookups])
+  result["matched"] = sum(1 for (t, p, loc) in lookups
+                          if dmp.match_main(t, p, loc) != -1)
+  return result
+
+
+def git_commit():
+  try:
+    p = subprocess.Popen(["git", "rev-parse", "HEAD"], cwd=DIR,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out = p.communicate()[0]
+    if p.returncode == 0:
+      return out.decode("utf-8").strip()
+  except OSError:
+    pass
+  return ""
+
+
+def compare(old, new):
+  print("%-10s %-30s %10s %10s %8s" % ("case", "", "old", "new", "new/old"))
+  for (case, result) in sorted(new["results"].items()):
+    for (name, value) in sorted(result.items()):
+      before = old.get("results", {}).get(case, {}).get(name)
+      if before is None:
+        continue
+      if isinstance(value, float):
+        ratio = value / before if before else float("inf")
+        print("%-10s %-30s %9.4fs %9.4fs %7.2fx" % (case, name, before, value,
+                                                    ratio))
+      elif value != before:
+        print("%-10s %-30s %10d %10d  changed" % (case, name, before, value))
+
+
+def main(argv):
+  (opts, paths) = getopt.getopt(argv, "o:c:r:")
+  opts = dict(opts)
+  repeat = int(opts.get("-r", 3))
+  dmp = dmp_module.diff_match_patch()
+  dmp.Diff_Timeout = 0
+
+  results = {}
+  for (case, pairs) in corpus(paths or [os.path.join(ROOT, "src")]):
+    results[case] = bench_case(dmp, pairs, repeat)
+  report = {
+    "python": platform.python_version(),
+    "commit": git_commit(),
+    "repeat": repeat,
+    "results": results,
+  }
+
+  out = json.dumps(report, indent=2, sort_keys=True)
+  if "-o" in opts:
+    with open(opts["-o"], "w") as f:
+      f.write(out + "\n")
+  else:
+    print(out)
+  if "-c" in opts:
+    with open(opts["-c"]) as f:
+      old = json.load(f)
+    compare(old, report)
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
@@ -19,9 +19,13 @@ limitations under the License.
 """
 
 import imp
+import os
+import random
 import sys
 import time
 import unittest
+# Test the shared module in the parent directory, not the re-export here.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import diff_match_patch as dmp_module
 # Force a module reload.  Allows one to edit the DMP module and rerun the tests
 # without leaving the Python interpreter.
@@ -360,6 +364,26 @@ class DiffTest(DiffMatchPatchTest):
     self.assertEqual([(self.dmp.DIFF_DELETE, "abwxyzcd"), (self.dmp.DIFF_INSERT, "12wxyz34")], diffs)
     self.dmp.Diff_EditCost = 4
 
+  def testDiffCleanupLarge(self):
+    # The cleanups give the same result for every block of a long diff as for
+    # a single block, and don't start over from the top after each one.
+    def blocks(diffs, n):
+      separator = [(self.dmp.DIFF_EQUAL, "separated")]
+      return (diffs + separator) * (n - 1) + diffs
+
+    n = 5000
+    diffs = blocks([(self.dmp.DIFF_INSERT, "12"), (self.dmp.DIFF_EQUAL, "x"), (self.dmp.DIFF_DELETE, "cd"), (self.dmp.DIFF_INSERT, "34")], n)
+    self.dmp.diff_cleanupEfficiency(diffs)
+    self.assertEqual(blocks([(self.dmp.DIFF_DELETE, "xcd"), (self.dmp.DIFF_INSERT, "12x34")], n), diffs)
+
+    diffs = blocks([(self.dmp.DIFF_DELETE, "a"), (self.dmp.DIFF_EQUAL, "b"), (self.dmp.DIFF_DELETE, "c")], n)
+    self.dmp.diff_cleanupSemantic(diffs)
+    self.assertEqual(blocks([(self.dmp.DIFF_DELETE, "abc"), (self.dmp.DIFF_INSERT, "b")], n), diffs)
+
+    diffs = blocks([(self.dmp.DIFF_INSERT, "b"), (self.dmp.DIFF_DELETE, "a"), (self.dmp.DIFF_INSERT, "c")], n)
+    self.dmp.diff_cleanupMerge(diffs)
+    self.assertEqual(blocks([(self.dmp.DIFF_DELETE, "a"), (self.dmp.DIFF_INSERT, "bc")], n), diffs)
+
   def testDiffPrettyHtml(self):
     # Pretty print.
     diffs = [(self.dmp.DIFF_EQUAL, "a\n"), (self.dmp.DIFF_DELETE, "<B>b</B>"), (self.dmp.DIFF_INSERT, "c&d")]
@@ -458,6 +482,68 @@ class DiffTest(DiffMatchPatchTest):
     # Timeout.
     self.assertEqual([(self.dmp.DIFF_DELETE, "cat"), (self.dmp.DIFF_INSERT, "map")], self.dmp.diff_bisect(a, b, 0))
 
+  def testDiffBisectEquivalence(self):
+    # The bisect must always find a minimal diff, however long the snakes.
+    def lcs(a, b):
+      row = [0] * (len(b) + 1)
+      for x in a:
+        prev = 0
+        for j in range(len(b)):
+          cur = row[j + 1]
+          row[j + 1] = prev + 1 if x == b[j] else max(row[j + 1], row[j])
+          prev = cur
+      return row[-1]
+
+    # Half-match trades minimality for speed, keep it out of the way.
+    self.dmp.Diff_Timeout = 0
+    rnd = random.Random(34)
+    for i in range(200):
+      alphabet = "ab" if i % 2 else "abcdefgh"
+      a = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 60)))
+      b = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 60)))
+      if i % 3 == 0:
+        # Long shared runs exercise the galloping snake.
+        run = "x" * rnd.randint(1, 300)
+        a = a[:5] + run + a[5:]
+        b = b[:7] + run + b[7:]
+      diffs = self.dmp.diff_bisect(a, b, sys.maxsize)
+      self.assertEqual(a, self.dmp.diff_text1(diffs))
+      self.assertEqual(b, self.dmp.diff_text2(diffs))
+      common = sum(len(t) for op, t in diffs if op == self.dmp.DIFF_EQUAL)
+      self.assertEqual(lcs(a, b), common)
+
+  def testDiffPatience(self):
+    # Null case.
+    self.assertEqual([], self.dmp.diff_patience("", ""))
+
+    # Anchors on the unique characters, not on the repeated ones.
+    self.assertEqual([(self.dmp.DIFF_EQUAL, "a"), (self.dmp.DIFF_INSERT, "xcx"), (self.dmp.DIFF_EQUAL, "b")], self.dmp.diff_patience("ab", "axcxb"))
+
+    self.assertEqual([(1, 2)], self.dmp.diff_patienceAnchors("xaybx", "zzaqqq"))
+
+    self.assertEqual([(0, 1), (1, 3)], self.dmp.diff_patienceAnchors("abc", "xacb"))
+
+    # Lines of code: a new function goes in between the old ones instead of
+    # borrowing their closing braces.
+    a = "func a() {\n\treturn\n}\n\nfunc b() {\n\treturn\n}\n"
+    b = "func a() {\n\treturn\n}\n\nfunc c() {\n\treturn\n}\n\nfunc b() {\n\treturn\n}\n"
+    (chars1, chars2, lines) = self.dmp.diff_linesToChars(a, b)
+    diffs = self.dmp.diff_patience(chars1, chars2)
+    self.dmp.diff_charsToLines(diffs, lines)
+    self.assertEqual([(self.dmp.DIFF_EQUAL, "func a() {\n\treturn\n}\n\n"), (self.dmp.DIFF_INSERT, "func c() {\n\treturn\n}\n\n"), (self.dmp.DIFF_EQUAL, "func b() {\n\treturn\n}\n")], diffs)
+
+    # Both line algorithms rebuild the texts.
+    rnd = random.Random(35)
+    lines = ["{\n", "}\n", "\n", "x := 1\n", "return\n"]
+    for i in range(100):
+      a = "".join(rnd.choice(lines) + ("f%d\n" % n if rnd.random() < 0.3 else "") for n in range(rnd.randint(1, 50)))
+      b = "".join(rnd.choice(lines) + ("f%d\n" % n if rnd.random() < 0.3 else "") for n in range(rnd.randint(1, 50)))
+      for algorithm in (self.dmp.DIFF_PATIENCE, self.dmp.DIFF_MYERS):
+        self.dmp.Diff_LineAlgorithm = algorithm
+        diffs = self.dmp.diff_lineMode(a, b, sys.maxsize)
+        self.assertEqual(a, self.dmp.diff_text1(diffs))
+        self.assertEqual(b, self.dmp.diff_text2(diffs))
+
   def testDiffMain(self):
     # Perform a trivial diff.
     # Null case.
@@ -633,6 +719,51 @@ class MatchTest(DiffMatchPatchTest):
       pass
 
 
+  def testMatchMany(self):
+    # Same answers as match_main, one per pattern.
+    self.assertEqual([], self.dmp.match_many("abcdef", [], []))
+
+    self.assertEqual([0, 3, 3, 3, 0], self.dmp.match_many("abcdef", ["abcdef", "", "de", "defy", "abcdefy"], [1000, 3, 3, 4, 0]))
+
+    self.assertEqual([-1, -1], self.dmp.match_many("", ["abcdef", "x"], [1, 0]))
+
+    self.dmp.Match_Threshold = 0.7
+    self.assertEqual([4, 4], self.dmp.match_many("I am the very model of a modern major general.", [" that berry ", " that berry "], [5, 5]))
+    self.dmp.Match_Threshold = 0.5
+
+    # Patterns aren't limited to Match_MaxBits.
+    text = "x" * 20 + "the quick brown fox jumps over the lazy dog" + "y" * 20
+    self.assertEqual([20], self.dmp.match_many(text, ["the quick brown fax jumps over the lazy dog"], [18]))
+
+    rnd = random.Random(37)
+    for i in range(100):
+      text = "".join(rnd.choice("abcd ") for _ in range(rnd.randint(1, 300)))
+      patterns = []
+      locs = []
+      for n in range(rnd.randint(1, 8)):
+        start = rnd.randrange(len(text))
+        pattern = list(text[start:start + rnd.randint(1, 40)])
+        pattern[rnd.randrange(len(pattern))] = rnd.choice("abcd ")
+        patterns.append("".join(pattern))
+        locs.append(start + rnd.randint(-10, 10))
+      self.assertEqual([self.dmp.match_main(text, p, loc) for (p, loc) in zip(patterns, locs)], self.dmp.match_many(text, patterns, locs))
+
+    # Test null inputs.
+    try:
+      self.dmp.match_many(None, ["a"], [0])
+      self.assertFalse(True)
+    except ValueError:
+      # Exception expected.
+      pass
+
+    try:
+      self.dmp.match_many("abc", ["a"], [])
+      self.assertFalse(True)
+    except ValueError:
+      # Exception expected.
+      pass
+
+
 class PatchTest(DiffMatchPatchTest):
   """PATCH TEST FUNCTIONS"""
 
@@ -647,6 +778,9 @@ class PatchTest(DiffMatchPatchTest):
     strp = str(p)
     self.assertEqual("@@ -21,18 +22,17 @@\n jump\n-s\n+ed\n  over \n-the\n+a\n %0Alaz\n", strp)
 
+    # No per-patch dict.
+    self.assertFalse(hasattr(p, "__dict__"))
+
   def testPatchFromText(self):
     self.assertEqual([], self.dmp.patch_fromText(""))
 
@@ -867,5 +1001,59 @@ class PatchTest(DiffMatchPatchTest):
     self.assertEqual(("x123", [True]), results)
 
 
+  def testPatchApplyStream(self):
+    # Same results as patch_apply.
+    self.dmp.patch_apply = self.dmp.patch_applyStream
+    self.testPatchApply()
+    del self.dmp.patch_apply
+
+    rnd = random.Random(38)
+    lines = ["func f%d() {\n" % n for n in range(20)] + ["}\n", "\n", "\treturn\n"]
+    for i in range(50):
+      text1 = "".join(rnd.choice(lines) for _ in range(rnd.randint(1, 60)))
+      text2 = "".join(rnd.choice(lines) for _ in range(rnd.randint(1, 60)))
+      text3 = list(text1)
+      for n in range(rnd.randint(0, 10)):
+        text3[rnd.randrange(len(text3))] = rnd.choice("xyz\n")
+      text3 = "".join(text3)
+      patches = self.dmp.patch_make(text1, text2)
+      self.assertEqual(self.dmp.patch_apply(patches, text3), self.dmp.patch_applyStream(patches, text3))
+
+    # Imperfect matches, where the edits can reach past the matched text.
+    patches = self.dmp.patch_make("ccccd  cgd", "ccd  gfeccgd")
+    self.assertEqual(("ccd  cgdgfec", [True]), self.dmp.patch_applyStream(patches, "gagdcccd  cgd"))
+
+    def edit(text, n):
+      text = list(text)
+      for _ in range(rnd.randint(0, n)):
+        i = rnd.randrange(len(text) + 1)
+        text[i:i + rnd.randint(0, 3)] = [rnd.choice("cdg ") for _ in range(rnd.randint(0, 3))]
+      return "".join(text)
+
+    for i in range(300):
+      text1 = "".join(rnd.choice("cdg ") for _ in range(rnd.randint(1, 80)))
+      text2 = edit(text1, 8)
+      text3 = edit(text1, 8)
+      patches = self.dmp.patch_make(text1, text2)
+      self.assertEqual(self.dmp.patch_apply(patches, text3), self.dmp.patch_applyStream(patches, text3))
+
+    # The patches can be used up instead of copied.
+    patches = self.dmp.patch_make("The quick brown fox jumps over the lazy dog.", "Woof")
+    results = self.dmp.patch_applyStream(patches, "The quick brown fox jumps over the lazy dog.", False)
+    self.assertEqual(("Woof", [True, True]), results)
+
+    # Strict matching, where the window can be cut short by the end of the text.
+    self.dmp.Match_Threshold = 0.0
+    patches = self.dmp.patch_make("bbcccac", "bbccc")
+    self.assertEqual(("bcccac", [False]), self.dmp.patch_applyStream(patches, "bcccac"))
+
+    for i in range(300):
+      text1 = "".join(rnd.choice("cdg ") for _ in range(rnd.randint(1, 80)))
+      text2 = edit(text1, 8)
+      text3 = edit(text1, 8)
+      patches = self.dmp.patch_make(text1, text2)
+      self.assertEqual(self.dmp.patch_apply(patches, text3), self.dmp.patch_applyStream(patches, text3))
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -18,10 +18,10 @@ type mPlay struct {
 	Env       map[string]string `json:"env"`
 	Cid       string            `json:"cid"`
 	BuildOnly bool              `json:"build_only"`
+	Stream    string            `json:"stream"`
 	b         *Broker
 }
 
-// todo: send the client output as it comes
 func (m *mPlay) Call() (interface{}, string) {
 	env := envSlice(m.Env)
 	dir, err := ioutil.TempDir(tempDir(m.Env), "play-")
@@ -54,6 +54,17 @@ func (m *mPlay) Call() (interface{}, string) {
 		killCmd(m.Cid)
 	}
 
+	if m.Stream != "" && tmpFn != "" {
+		// let the client replace tmpFn in the output before it sees any of it
+		m.b.Send(Response{
+			Token: m.Stream,
+			Data: M{
+				"tmpFn": tmpFn,
+				"fn":    m.Fn,
+			},
+		})
+	}
+
 	res := M{}
 	stdErr := bytes.NewBuffer(nil)
 	stdOut := bytes.NewBuffer(nil)
@@ -62,8 +73,9 @@ func (m *mPlay) Call() (interface{}, string) {
 		stdOut.Reset()
 		stdErr.Reset()
 		c := exec.Command(name, args...)
-		c.Stdout = stdOut
-		c.Stderr = stdErr
+		var flush func()
+		c.Stdout, c.Stderr, flush = newStreamWriters(m.b, m.Stream, stdOut, stdErr)
+		defer flush()
 		c.Dir = m.Dir
 		c.Env = env
 
@@ -16,14 +16,15 @@ type mShCmd struct {
 }
 
 type mSh struct {
-	Env map[string]string
-	Cmd mShCmd
-	Cid string
-	Cwd string
+	Env    map[string]string
+	Cmd    mShCmd
+	Cid    string
+	Cwd    string
+	Stream string
+	b      *Broker
 }
 
-// todo: send the client output as it comes
-//       handle And, Or
+// todo: handle And, Or
 func (m *mSh) Call() (interface{}, string) {
 	env := envSlice(m.Env)
 
@@ -37,8 +38,8 @@ func (m *mSh) Call() (interface{}, string) {
 	stdErr := bytes.NewBuffer(nil)
 	stdOut := bytes.NewBuffer(nil)
 	c := exec.Command(m.Cmd.Name, m.Cmd.Args...)
-	c.Stdout = stdOut
-	c.Stderr = stdErr
+	var flush func()
+	c.Stdout, c.Stderr, flush = newStreamWriters(m.b, m.Stream, stdOut, stdErr)
 	if m.Cmd.Input != "" {
 		c.Stdin = strings.NewReader(m.Cmd.Input)
 	}
@@ -48,6 +49,7 @@ func (m *mSh) Call() (interface{}, string) {
 	watchCmd(m.Cid, c)
 	err := c.Run()
 	unwatchCmd(m.Cid)
+	flush()
 
 	res := M{
 		"out": jData(stdOut.Bytes()),
@@ -59,6 +61,6 @@ func (m *mSh) Call() (interface{}, string) {
 
 func init() {
 	registry.Register("sh", func(b *Broker) Caller {
-		return &mSh{}
+		return &mSh{b: b}
 	})
 }
@@ -0,0 +1,65 @@
+package margo_pkg
+
+import (
+	"bytes"
+	"io"
+	"sync"
+)
+
+// streamWriter sends a command's output to the client as it comes, under the token `token`,
+// instead of holding all of it until the command exits.
+// Output is sent a line at a time (partial lines are held back until they're completed or Flush is called)
+// and it's sent through the broker directly, so the client sees all of it before the command's response.
+type streamWriter struct {
+	sync.Mutex
+	b     *Broker
+	token string
+	key   string
+	buf   []byte
+}
+
+// newStreamWriters returns writers for stdout and stderr that stream to `token`.
+// If `token` is empty, the client didn't ask for streaming, so the output is collected in `stdOut` and `stdErr`.
+func newStreamWriters(b *Broker, token string, stdOut, stdErr *bytes.Buffer) (out, err io.Writer, flush func()) {
+	if token == "" || b == nil {
+		return stdOut, stdErr, func() {}
+	}
+
+	o := &streamWriter{b: b, token: token, key: "out"}
+	e := &streamWriter{b: b, token: token, key: "err"}
+	return o, e, func() {
+		o.Flush()
+		e.Flush()
+	}
+}
+
+func (w *streamWriter) Write(p []byte) (int, error) {
+	w.Lock()
+	defer w.Unlock()
+
+	w.buf = append(w.buf, p...)
+	if i := bytes.LastIndex(w.buf, []byte{'\n'}); i >= 0 {
+		w.send(w.buf[:i+1])
+		w.buf = append(w.buf[:0], w.buf[i+1:]...)
+	}
+	return len(p), nil
+}
+
+func (w *streamWriter) Flush() {
+	w.Lock()
+	defer w.Unlock()
+
+	if len(w.buf) != 0 {
+		w.send(w.buf)
+		w.buf = w.buf[:0]
+	}
+}
+
+func (w *streamWriter) send(p []byte) {
+	w.b.Send(Response{
+		Token: w.token,
+		Data: M{
+			w.key: jData(p),
+		},
+	})
+}